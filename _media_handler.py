@@ -0,0 +1,133 @@
+"""
+Request handler and server shared by media_server.py and map_viewer.py
+"""
+
+import functools
+import http.server
+import mimetypes
+import os
+import socket
+import stat
+import urllib.parse
+
+@functools.lru_cache(maxsize=256)
+def _type_for_extension(ext):
+    """mimetypes' type for a lowercase extension, memoized: one entry per extension, not per file"""
+    guess, _ = mimetypes.guess_type('x' + ext)
+    return guess or 'application/octet-stream'
+
+def gzip_is_stale(path):
+    """True if path + '.gz' exists but is older than path, e.g. after the page was replaced"""
+    try:
+        return os.stat(path + '.gz').st_mtime_ns < os.stat(path).st_mtime_ns
+    except OSError:
+        return False
+
+class MediaHandler(http.server.SimpleHTTPRequestHandler):
+    """SimpleHTTPRequestHandler with CORS headers and ETag revalidation"""
+    
+    # Keep-alive: every response here carries a Content-Length
+    protocol_version = 'HTTP/1.1'
+    
+    # ETag of the file being sent, added by end_headers()
+    _etag = None
+    
+    def end_headers(self):
+        # Add CORS headers so pages on other origins can load the media
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'GET')
+        # Browsers may keep copies, but must revalidate them each time
+        self.send_header('Cache-Control', 'no-cache')
+        if self._etag is not None:
+            self.send_header('ETag', self._etag)
+            self._etag = None
+        # Pages may be sent gzipped, so caches must key them on Accept-Encoding
+        if urllib.parse.urlsplit(self.path).path.endswith('.html'):
+            self.send_header('Vary', 'Accept-Encoding')
+        super().end_headers()
+    
+    def _not_modified(self):
+        """Answer 304 if the client's If-None-Match has self._etag"""
+        tags = [tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')]
+        if self._etag in tags or '*' in tags:
+            self.send_response(http.HTTPStatus.NOT_MODIFIED)
+            self.end_headers()
+            return True
+        return False
+    
+    def send_head(self):
+        path = self.translate_path(self.path)
+        self._etag = None
+        
+        # csv_to_map.py writes a gzipped copy next to each page; send that
+        # instead to clients that accept gzip, unless the page is newer
+        f = None
+        if (path.endswith('.html') and 'gzip' in self.headers.get('Accept-Encoding', '').lower()
+                and not gzip_is_stale(path)):
+            try:
+                f = open(path + '.gz', 'rb')
+            except OSError:
+                pass
+        
+        if f is None:
+            # Directories, errors and If-Modified-Since are left to the base class
+            try:
+                fs = os.stat(path)
+            except OSError:
+                return super().send_head()
+            if stat.S_ISREG(fs.st_mode):
+                self._etag = f'W/"{fs.st_mtime_ns:x}-{fs.st_size:x}"'
+                if self._not_modified():
+                    return None
+            return super().send_head()
+        
+        try:
+            fs = os.fstat(f.fileno())
+            self._etag = f'W/"{fs.st_mtime_ns:x}-{fs.st_size:x}-gz"'
+            if self._not_modified():
+                f.close()
+                return None
+            self.send_response(http.HTTPStatus.OK)
+            self.send_header('Content-type', self.guess_type(path))
+            self.send_header('Content-Encoding', 'gzip')
+            self.send_header('Content-Length', str(fs.st_size))
+            self.send_header('Last-Modified', self.date_time_string(fs.st_mtime))
+            self.end_headers()
+            return f
+        except:
+            f.close()
+            raise
+    
+    def copyfile(self, source, outputfile):
+        # socket.sendfile() copies in the kernel via os.sendfile() where the OS
+        # has it, and falls back to a send() loop elsewhere
+        if outputfile is self.wfile:
+            self.connection.sendfile(source)
+        else:
+            super().copyfile(source, outputfile)
+    
+    def guess_type(self, path):
+        # The base class's lookup, so extensions_map overrides still apply
+        ext = os.path.splitext(path)[1]
+        if ext in self.extensions_map:
+            return self.extensions_map[ext]
+        ext = ext.lower()
+        if ext in self.extensions_map:
+            return self.extensions_map[ext]
+        return _type_for_extension(ext)
+
+def make_handler(directory, handler_class=MediaHandler):
+    """handler_class bound to serve directory, for passing to a server"""
+    # SimpleHTTPRequestHandler takes directory= itself, so no __init__ override
+    return functools.partial(handler_class, directory=directory)
+
+class MediaHTTPServer(http.server.ThreadingHTTPServer):
+    """ThreadingHTTPServer with Nagle's algorithm off and a 1 MiB send buffer"""
+    
+    def server_bind(self):
+        # Accepted connections inherit these from the listening socket, so
+        # response headers are not held back waiting on the client's ACK
+        self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 1 << 20)
+        super().server_bind()
+
@@ -1,68 +1,370 @@
 #!/usr/bin/env python3
 """Quick build - uses existing media_map.html"""
 
+import ast
+import asyncio
+import contextlib
+import hashlib
+import importlib
+import importlib.util
+import io
+import os
+import shutil
 import subprocess
 import sys
+import traceback
+from collections import deque
+from importlib.metadata import PackageNotFoundError, version
 from pathlib import Path
 
+from _media_handler import gzip_is_stale
+
+# OneDir is the default: a onefile exe unpacks itself to a temp folder on
+# every launch. Set PYINSTALLER_BUILD_ONEFILE=1 to produce a single exe anyway.
+ONEFILE = os.environ.get('PYINSTALLER_BUILD_ONEFILE') == '1'
+if ONEFILE:
+    EXE_PATH = Path('dist/MapMediaViewer.exe')
+else:
+    EXE_PATH = Path('dist/MapMediaViewer/MapMediaViewer.exe')
+
+SPEC_FILE = Path('MapMediaViewer.spec')
+BUILD_CACHE = Path('.build_cache')
+SIZE_BASELINE = BUILD_CACHE / 'size_baseline.txt'
+LAST_KEY = BUILD_CACHE / 'last_key'
+
+# Local wheelhouse for offline installs: pip download pyinstaller==6.16.0 -d wheels
+WHEELS_DIR = Path('wheels')
+PYINSTALLER_VERSION = '6.16.0'  # keep in step with requirements.txt
+
+# Everything that can change the bundle; an unchanged key means nothing to do
+KEY_INPUTS = ['map_viewer.py', 'media_server.py', '_media_handler.py', 'media_map.html', 'media_map.html.gz',
+              'requirements.txt', 'build_quick.py', 'map_icon.ico', SPEC_FILE.name]
+
+# --no-excludes builds without EXCLUDES to record the baseline bundle size
+NO_EXCLUDES = '--no-excludes' in sys.argv
+
+# Stdlib packages map_viewer.py never imports
+EXCLUDES = [
+    'tkinter.test',
+    'test',
+    'unittest',
+    'pydoc_data',
+    'distutils',
+    'setuptools',
+    'pip',
+    'email.test',
+    'sqlite3.test',
+    'lib2to3',
+    'xmlrpc',
+]
+
+SPEC_TEMPLATE = '''# -*- mode: python ; coding: utf-8 -*-
+# Generated by build_quick.py and overwritten on each build; edit SPEC_TEMPLATE there instead.
+import os
+
+ONEFILE = os.environ.get('PYINSTALLER_BUILD_ONEFILE') == '1'
+NO_EXCLUDES = os.environ.get('MMV_NO_EXCLUDES') == '1'
+
+a = Analysis(
+    ['map_viewer.py'],
+    pathex=[],
+    binaries=[],
+    # The gzipped copy csv_to_map.py writes, when there is one
+    datas=[(name, '.') for name in ('media_map.html', 'media_map.html.gz') if os.path.exists(name)],
+    hiddenimports=[],
+    hookspath=[],
+    runtime_hooks=[],
+    excludes=[] if NO_EXCLUDES else {excludes!r},
+    noarchive=False,
+)
+pyz = PYZ(a.pure)
+
+if ONEFILE:
+    exe = EXE(
+        pyz,
+        a.scripts,
+        a.binaries,
+        a.datas,
+        [],
+        name='MapMediaViewer',
+        debug=False,
+        strip=False,
+        upx=True,
+        upx_exclude=['vcruntime140.dll'],
+        runtime_tmpdir=None,
+        console=True,
+        icon={icon!r},
+    )
+else:
+    exe = EXE(
+        pyz,
+        a.scripts,
+        [],
+        exclude_binaries=True,
+        name='MapMediaViewer',
+        debug=False,
+        strip=False,
+        upx=True,
+        upx_exclude=['vcruntime140.dll'],
+        console=True,
+        icon={icon!r},
+    )
+    coll = COLLECT(
+        exe,
+        a.binaries,
+        a.datas,
+        strip=False,
+        upx=True,
+        upx_exclude=['vcruntime140.dll'],
+        name='MapMediaViewer',
+    )
+'''
+
+
+class TeeIO(io.TextIOBase):
+    """Writes through to a stream while keeping the last lines written"""
+
+    def __init__(self, stream, maxlen=50):
+        self.stream = stream
+        self.tail = deque(maxlen=maxlen)
+        self._partial = ''
+
+    def write(self, text):
+        self.stream.write(text)
+        *lines, self._partial = (self._partial + text).split('\n')
+        self.tail.extend(line + '\n' for line in lines)
+        return len(text)
+
+    def flush(self):
+        self.stream.flush()
+
+
+def run_pyinstaller(args):
+    """Run PyInstaller in this process; returns (returncode, last log lines)"""
+    tee = TeeIO(sys.stdout)
+    with contextlib.redirect_stdout(tee), contextlib.redirect_stderr(tee):
+        # Imported here so PyInstaller's log handler binds to the tee
+        import PyInstaller.__main__
+        try:
+            PyInstaller.__main__.run(args)
+            returncode = 0
+        except SystemExit as e:
+            if e.code is None or isinstance(e.code, int):
+                returncode = e.code or 0
+            else:
+                # PyInstaller reports fatal errors as SystemExit('message')
+                print(e.code, file=sys.stderr)
+                returncode = 1
+        except Exception:
+            # A hook or Analysis error; keep its traceback after the log tail
+            tee.tail.append(traceback.format_exc())
+            returncode = 1
+    return returncode, tee.tail
+
+
+def missing_imports(script):
+    """Modules imported by script that cannot be found in this environment"""
+    tree = ast.parse(Path(script).read_bytes(), filename=script)
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0:
+            names.add(node.module)
+    missing = []
+    for name in sorted(names):
+        try:
+            if importlib.util.find_spec(name) is None:
+                missing.append(name)
+        except ModuleNotFoundError:
+            # Parent package of a dotted name is missing
+            missing.append(name)
+    return missing
+
+
+def tree_size(path):
+    """Total size of the files under path; only files are stat'd"""
+    total = 0
+    with os.scandir(path) as it:
+        for entry in it:
+            # is_dir()/is_file() come from the directory listing itself
+            if entry.is_dir(follow_symlinks=False):
+                total += tree_size(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                total += entry.stat(follow_symlinks=False).st_size
+    return total
+
+
+def build_key_for(entries, upx):
+    """Hash of every input that can change the bundle, including the tools that build it"""
+    try:
+        pyinstaller_version = version('pyinstaller')
+    except PackageNotFoundError:
+        pyinstaller_version = None
+    key = hashlib.blake2b()
+    key.update(f"{sys.version} onefile={ONEFILE} no_excludes={NO_EXCLUDES}".encode())
+    key.update(f"pyinstaller={pyinstaller_version} upx={upx}".encode())
+    for name in KEY_INPUTS:
+        if name in entries:
+            key.update(name.encode())
+            key.update(Path(name).read_bytes())
+    return key.hexdigest()
+
+
+async def copy_datafiles():
+    """Stage a loose media_map.html (and its .gz) in dist/ so the viewer need not extract it"""
+    Path('dist').mkdir(exist_ok=True)
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, shutil.copy2, 'media_map.html', 'dist/media_map.html')
+    # copy2 keeps the source mtimes, so the staged pair is exactly as fresh as the originals
+    if Path('media_map.html.gz').exists():
+        await loop.run_in_executor(None, shutil.copy2, 'media_map.html.gz', 'dist/media_map.html.gz')
+    else:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove('dist/media_map.html.gz')
+
+
+async def build(args):
+    """Run PyInstaller with the data-file staging overlapped"""
+    loop = asyncio.get_running_loop()
+    (returncode, log_tail), _ = await asyncio.gather(
+        loop.run_in_executor(None, run_pyinstaller, args), copy_datafiles()
+    )
+    return returncode, log_tail
+
+
 print("="*70)
 print("BUILDING EXECUTABLE (Using existing map)")
 print("="*70)
+print("♻️  Incremental build: reuses build/MapMediaViewer/ from previous runs")
+print("   (pass --fresh for a clean rebuild)")
+
+# One directory listing answers every "does this file exist" question below
+entries = {entry.name for entry in os.scandir('.')}
 
 # Check if map exists
-if not Path('media_map.html').exists():
+if 'media_map.html' not in entries:
     print("❌ media_map.html not found!")
     print("   Run: python csv_to_map.py first")
     sys.exit(1)
 
 print("✅ Found media_map.html")
 
-# Check PyInstaller
+# A .gz older than the page is left over from an earlier map; never bundle it
+if 'media_map.html.gz' in entries and gzip_is_stale('media_map.html'):
+    os.remove('media_map.html.gz')
+    entries.discard('media_map.html.gz')
+    print("🗑️  Removed stale media_map.html.gz (older than media_map.html)")
+
+# Rewrite the spec only when the template or icon changed; an untouched spec
+# lets PyInstaller reuse its cached stages
+icon = 'map_icon.ico' if 'map_icon.ico' in entries else None
+spec_text = SPEC_TEMPLATE.format(excludes=EXCLUDES, icon=icon)
+if SPEC_FILE.name not in entries or SPEC_FILE.read_text(encoding='utf-8') != spec_text:
+    SPEC_FILE.write_text(spec_text, encoding='utf-8')
+    entries.add(SPEC_FILE.name)
+    print(f"✅ Generated {SPEC_FILE}")
+
+# Skip PyInstaller entirely when none of its inputs changed since the last build
+upx = shutil.which('upx')
+build_key = build_key_for(entries, upx)
+
+if ('--fresh' not in sys.argv and EXE_PATH.exists() and LAST_KEY.exists()
+        and LAST_KEY.read_text(encoding='utf-8') == build_key):
+    print(f"✅ Cached build is fresh: {EXE_PATH}")
+    sys.exit(0)
+
+# Fail in milliseconds on a broken import instead of late in PyInstaller's Analysis
+missing = missing_imports('map_viewer.py')
+if missing:
+    print(f"❌ Missing imports in map_viewer.py: {', '.join(missing)}")
+    sys.exit(1)
+
+# Check PyInstaller (metadata only - importing the package is slow)
 try:
-    import PyInstaller
-    print("✅ PyInstaller is installed")
-except ImportError:
-    print("Installing PyInstaller...")
-    subprocess.check_call([sys.executable, '-m', 'pip', 'install', 'pyinstaller'])
+    print(f"✅ PyInstaller {version('pyinstaller')} is installed")
+except PackageNotFoundError:
+    pin = f'pyinstaller=={PYINSTALLER_VERSION}'
+    if any(WHEELS_DIR.glob(f'pyinstaller-{PYINSTALLER_VERSION}-*.whl')):
+        print(f"Installing PyInstaller {PYINSTALLER_VERSION} from {WHEELS_DIR}/...")
+        try:
+            subprocess.check_call([sys.executable, '-m', 'pip', 'install', '--no-index',
+                                   f'--find-links={WHEELS_DIR}', pin])
+        except subprocess.CalledProcessError:
+            print(f"❌ Offline install of {pin} failed: {WHEELS_DIR}/ is missing it or one of its dependencies")
+            print(f"   Run: pip download {pin} -d {WHEELS_DIR}")
+            sys.exit(1)
+    else:
+        print(f"Installing PyInstaller {PYINSTALLER_VERSION}...")
+        subprocess.check_call([sys.executable, '-m', 'pip', 'install', pin])
+    importlib.invalidate_caches()
+    # Key the build on the version that was just installed
+    build_key = build_key_for(entries, upx)
 
 # Build
 print("\n🔨 Building executable...")
 try:
-    result = subprocess.run([
-        sys.executable, 
-        '-m', 
-        'PyInstaller',
-        '--clean',
-        '--noconfirm',
-        '--onefile',
-        '--console',
-        '--name=MapMediaViewer',
-        '--add-data=media_map.html;.',
-        '--icon=map_icon.ico' if Path('map_icon.ico').exists() else '',
-        'map_viewer.py'
-    ], capture_output=True, text=True)
+    args = ['--noconfirm']
+    if '--fresh' in sys.argv:
+        args.append('--clean')
+    # Compress the bundled binaries when UPX is on PATH
+    if upx:
+        args.append(f'--upx-dir={Path(upx).parent}')
+    args.append(str(SPEC_FILE))
+    if NO_EXCLUDES:
+        os.environ['MMV_NO_EXCLUDES'] = '1'
+    
+    returncode, log_tail = asyncio.run(build(args))
     
-    if result.returncode == 0:
+    if returncode == 0:
         print("\n" + "="*70)
         print("✅ BUILD COMPLETE!")
         print("="*70)
-        exe_path = Path('dist/MapMediaViewer.exe')
+        BUILD_CACHE.mkdir(exist_ok=True)
+        LAST_KEY.write_text(build_key, encoding='utf-8')
+        exe_path = EXE_PATH
         if exe_path.exists():
-            size_mb = exe_path.stat().st_size / (1024 * 1024)
+            if ONEFILE:
+                size_bytes = exe_path.stat().st_size
+            else:
+                size_bytes = tree_size(exe_path.parent)
+            size_mb = size_bytes / (1024 * 1024)
             print(f"\n📂 Executable: {exe_path.absolute()}")
             print(f"📏 Size: {size_mb:.1f} MB")
+            if upx:
+                print(f"🗜️  UPX: used ({upx})")
+            else:
+                print("🗜️  UPX: not found, binaries left uncompressed")
+            
+            # Compare against the last --no-excludes build of the same mode
+            mode = 'onefile' if ONEFILE else 'onedir'
+            if NO_EXCLUDES:
+                BUILD_CACHE.mkdir(exist_ok=True)
+                SIZE_BASELINE.write_text(f"{mode} {size_bytes}", encoding='utf-8')
+                print("   Saved as the size baseline (no module exclusions)")
+            elif SIZE_BASELINE.exists():
+                baseline_mode, baseline_bytes = SIZE_BASELINE.read_text(encoding='utf-8').split()
+                if baseline_mode == mode:
+                    saved_bytes = int(baseline_bytes) - size_bytes
+                    print(f"   Module exclusions save {saved_bytes / (1024 * 1024):.1f} MB "
+                          f"({saved_bytes / int(baseline_bytes):.0%}) vs. baseline")
             print("\n📋 TO DISTRIBUTE:")
-            print("   1. Copy dist/MapMediaViewer.exe")
+            if ONEFILE:
+                print("   1. Copy dist/MapMediaViewer.exe")
+            else:
+                print("   1. Copy the entire dist/MapMediaViewer/ folder")
             print("   2. Copy your entire Media folder")
             print("   3. User puts them together and runs MapMediaViewer.exe")
+            print("   (optional) Copy dist/media_map.html (and .gz) next to them to skip extracting the map")
             print("\n" + "="*70)
         else:
             print("❌ Executable not found in dist folder")
     else:
         print("❌ Build failed!")
-        print(result.stderr)
+        print(''.join(log_tail))
         sys.exit(1)
         
 except Exception as e:
     print(f"❌ Error: {e}")
+    traceback.print_exc()
     sys.exit(1)
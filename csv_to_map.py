@@ -3,18 +3,36 @@ CSV/XLSX to Interactive HTML Map Generator
 Creates standalone HTML maps with media support via local web server
 """
 
+import numpy as np
 import pandas as pd
 from pathlib import Path
 import folium
+import jinja2
 from folium import IFrame
 from folium.plugins import MarkerCluster
+import asyncio
 import json
 import base64
+import errno
+import gzip
+import hashlib
+import re
 from urllib.parse import quote
 import webbrowser
+import select
+import selectors
+import shutil
+import socket
 import sys
+import time
 import os
 
+# orjson is optional; it serializes the embedded marker payloads several times faster
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Handle PyInstaller bundled resources
 def resource_path(relative_path):
     """Get absolute path to resource, works for dev and for PyInstaller"""
@@ -25,67 +43,247 @@ def resource_path(relative_path):
         base_path = os.path.abspath(".")
     return os.path.join(base_path, relative_path)
 
-def add_sidebar_to_html(html_file, df, date_col='date', time_col='time'):
+def _str_column(df, col, default):
+    """Column as strings (missing cells become 'nan', like str()), or default if absent"""
+    if col not in df.columns:
+        return pd.Series(default, index=df.index, dtype=object)
+    return df[col].astype(str).fillna('nan')
+
+def _dumps(obj):
+    """Compact JSON for embedding in the page, non-ASCII left unescaped"""
+    if orjson is not None:
+        return orjson.dumps(obj).decode('utf-8')
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
+
+def _media_key(path):
+    """Normalized absolute path used to look files up in _media_sizes()"""
+    return os.path.normcase(os.path.abspath(path))
+
+def _media_sizes(paths):
+    """Sizes of the files among paths that exist, keyed by _media_key(); each folder is listed once"""
+    wanted = {}
+    for path in set(paths):
+        key = _media_key(path)
+        wanted.setdefault(os.path.dirname(key), set()).add(os.path.basename(key))
+    
+    sizes = {}
+    for folder, names in wanted.items():
+        try:
+            with os.scandir(folder) as it:
+                for entry in it:
+                    name = os.path.normcase(entry.name)
+                    if name in names and entry.is_file():
+                        sizes[os.path.join(folder, name)] = entry.stat().st_size
+        except OSError:
+            # Missing or unreadable folder: none of its files count as present
+            continue
+    return sizes
+
+def _coord_key(lat, lon):
+    """Canonical 'lat,lon' string used to match sidebar items to markers"""
+    return f"{lat:.5f},{lon:.5f}"
+
+def _haversine_km(lats, lons, lat0, lon0):
+    """Great-circle distances in km from (lat0, lon0) to each point of the arrays"""
+    lats, lons = np.radians(lats), np.radians(lons)
+    lat0, lon0 = np.radians(lat0), np.radians(lon0)
+    a = np.sin((lats - lat0) / 2) ** 2 + np.cos(lat0) * np.cos(lats) * np.sin((lons - lon0) / 2) ** 2
+    return 2 * 6371.0 * np.arcsin(np.sqrt(a))
+
+def _medoid(lats, lons, sample=1000):
     """
-    Add a collapsible sidebar with file tree organized chronologically by datetime.
+    The data point with the least total distance to the others, or None.
+    Computed over an evenly spaced sample of at most sample points.
     """
-    
-    # Read the HTML file
-    with open(html_file, 'r', encoding='utf-8') as f:
-        html_content = f.read()
-    
-    # Sort dataframe by datetime column for chronological order
-    df_sorted = df.copy()
-    if 'datetime' in df_sorted.columns:
-        df_sorted['datetime'] = pd.to_datetime(df_sorted['datetime'], errors='coerce')
-        df_sorted = df_sorted.sort_values('datetime')
-    
-    # Organize data chronologically
-    from collections import defaultdict, OrderedDict
-    tree = OrderedDict()
-    
-    for idx, row in df_sorted.iterrows():
-        date = str(row.get(date_col, 'Unknown Date')) if date_col in row.index else 'Unknown Date'
-        
-        # Extract time from datetime column if available
-        datetime_val = row.get('datetime', '') if 'datetime' in row.index else ''
-        if pd.notna(datetime_val) and datetime_val != '':
-            try:
-                dt = pd.to_datetime(datetime_val)
-                time = dt.strftime('%H:%M:%S')  # Extract time component
-                date = dt.strftime('%Y-%m-%d')  # Use consistent date format
-            except:
-                time = str(row.get(time_col, '')) if time_col in row.index else ''
-        else:
-            time = str(row.get(time_col, '')) if time_col in row.index else ''
-        
-        title = str(row.get('title', 'Untitled'))
-        media_path = str(row.get('media_path', ''))
-        lat = row.get('latitude', 0)
-        lon = row.get('longitude', 0)
-        data_source = str(row.get('data_source', 'MediaMarkers'))
-        
-        if date and date != 'nan':
-            if date not in tree:
-                tree[date] = OrderedDict()
-            if time not in tree[date]:
-                tree[date][time] = []
-            
-            tree[date][time].append({
-                'title': title,
-                'path': media_path,
-                'lat': lat,
-                'lon': lon,
-                'idx': idx,
-                'datetime': str(datetime_val) if pd.notna(datetime_val) else '',
-                'data_source': data_source
-            })
-    
-    # Dates are already in chronological order from sorted dataframe
-    sorted_dates = list(tree.keys())
-    
-    # Build sidebar HTML with professional styling
-    sidebar_html = """
+    valid = np.flatnonzero(~(np.isnan(lats) | np.isnan(lons)))
+    if len(valid) == 0:
+        return None
+    idx = valid[np.linspace(0, len(valid) - 1, min(len(valid), sample)).astype(int)]
+    lat_s, lon_s = lats[idx], lons[idx]
+    totals = _haversine_km(lat_s, lon_s, lat_s[:, None], lon_s[:, None]).sum(axis=1)
+    best = idx[np.argmin(totals)]
+    return lats[best], lons[best]
+
+# Points further than this from the medoid (the most central data point) are
+# outliers: they do not pull the map center and go into their own cluster,
+# hidden by default. Only a minority of points can be outliers.
+OUTLIER_DISTANCE_KM = 500
+
+# Known MasterMapData.csv column types, so the C parser need not infer them;
+# coordinates stay float64 to keep their exported precision. Accuracy is left
+# to inference: popups print it, and whole meters should not show as 68.0
+MASTER_DTYPES = {
+    'LATITUDE': 'float64',
+    'LONGITUDE': 'float64',
+    'Event': 'category'
+}
+
+# Generated sidebar fragments, keyed by a hash of the data and of this module
+SIDEBAR_CACHE_DIR = Path('.map_cache')
+SIDEBAR_CACHE_KEEP = 8  # most recently used fragments kept on disk
+try:
+    _CODE_VERSION = hashlib.blake2b(Path(__file__).read_bytes(), digest_size=8).digest()
+except OSError:
+    _CODE_VERSION = b''
+
+# "| Modified: YYYY-MM-DD HH:MM" suffix stripped from popup descriptions
+_MODIFIED_RE = re.compile(r'\s*\|\s*Modified:\s*[\d\-:\s]+')
+
+# Popup media blocks, filled per marker with .format()
+_IMAGE_POPUP_BLOCK = """
+<img src="{url}" style="width: 100%; max-width: 400px; height: auto; border-radius: 5px; margin: 10px 0;"/>
+<p style="margin: 5px 0; color: #666; font-size: 0.9em;">📷 {name} ({size_mb:.1f} MB)</p>
+"""
+
+_VIDEO_POPUP_BLOCK = """
+<video controls preload="metadata" style="width: 100%; max-width: 550px; height: 300px; border-radius: 5px; margin: 10px 0; background: #000;" onerror="this.style.display='none'; this.nextElementSibling.style.display='block';">
+    <source src="{url}" type="{mime_type}">
+    Your browser does not support this video format.
+</video>
+<div style="display:none; padding: 15px; background: #fff3cd; border: 1px solid #ffc107; border-radius: 5px; margin: 10px 0;">
+    <p style="margin: 0; color: #856404;">⚠️ Video preview not available. Click the button below to open the video in a new tab.</p>
+</div>
+<p style="margin: 5px 0; color: #666; font-size: 0.9em;">🎥 {name} ({size_mb:.1f} MB)</p>
+<p style="margin: 5px 0;">
+    <a href="{url}" target="_blank" style="color: #0066cc; text-decoration: none; background: #007bff; color: white; padding: 8px 15px; border-radius: 3px; display: inline-block; font-weight: bold;">▶ Open Video in New Tab</a>
+</p>
+"""
+
+_MEDIA_PATH_POPUP_BLOCK = """
+<p style="background: #f0f0f0; padding: 10px; border-radius: 3px; font-family: monospace; word-break: break-all; font-size: 0.85em;">
+{path}
+</p>
+<p style="margin: 5px 0; color: #666; font-size: 0.9em;">
+{kind}: {name} ({size_mb:.1f} MB)
+</p>
+"""
+
+# Variables folium assigns to the clusters, the accuracy feature group and the map
+_CLUSTER_VAR_RE = re.compile(r'var\s+(marker_cluster_[a-f0-9]+)\s+=\s+L\.markerClusterGroup')
+_FEATURE_GROUP_VAR_RE = re.compile(r'var\s+(feature_group_[a-f0-9]+)\s+=\s+L\.featureGroup')
+_MAP_VAR_RE = re.compile(r'var\s+(map_[a-f0-9]+)\s+=\s+L\.map')
+
+# Marker popup shell; the title, media, description and metadata blocks are filled per row
+_POPUP_TEMPLATE = (
+    "<div style='font-family: Arial; max-width: 400px;'>"
+    "<h3 style='margin-top: 0; color: #333;'>{title}</h3>"
+    "{media}"
+    "{description}"
+    "<div style='margin-top: 10px; padding-top: 10px; border-top: 1px solid #ddd; font-size: 0.9em; color: #666;'>"
+    "{metadata}"
+    "</div>"
+    "</div>"
+)
+
+# Turns date/time labels into element-id-safe slugs in one pass
+_SLUG_TABLE = str.maketrans({'/': '-', ' ': '_', ':': '-'})
+
+# Folium marker colors accepted from the CSV color column
+_MARKER_COLORS = {
+    'red': 'red',
+    'blue': 'blue',
+    'green': 'green',
+    'purple': 'purple',
+    'orange': 'orange',
+    'darkred': 'darkred',
+    'lightred': 'lightred',
+    'beige': 'beige',
+    'darkblue': 'darkblue',
+    'darkgreen': 'darkgreen',
+    'cadetblue': 'cadetblue',
+    'darkpurple': 'darkpurple',
+    'white': 'white',
+    'pink': 'pink',
+    'lightblue': 'lightblue',
+    'lightgreen': 'lightgreen',
+    'gray': 'gray',
+    'black': 'black',
+    'lightgray': 'lightgray'
+}
+
+# CSV icon names -> Font Awesome icons
+_MARKER_ICONS = {
+    'camera': 'camera',
+    'video': 'video-camera',
+    'photo': 'picture-o',
+    'film': 'film',
+    'play': 'play-circle',
+    'location': 'map-marker',
+    'home': 'home',
+    'car': 'car',
+    'flag': 'flag',
+    'info': 'info-circle',
+    'star': 'star',
+    'circle': 'circle'
+}
+
+# Video extensions -> proper MIME types for the popup <source> tag
+_VIDEO_MIME_TYPES = {
+    '.mp4': 'video/mp4',
+    '.m4v': 'video/mp4',
+    '.webm': 'video/webm',
+    '.ogv': 'video/ogg',
+    '.avi': 'video/x-msvideo',
+    '.mov': 'video/quicktime',
+    '.wmv': 'video/x-ms-wmv',
+    '.mkv': 'video/x-matroska'
+}
+
+# Folium marker colors -> CSS/hex colors for accuracy circles
+_CIRCLE_COLORS = {
+    'lightgreen': '#90EE90',
+    'orange': '#FFA500',
+    'blue': '#0000FF',
+    'red': '#FF0000',
+    'green': '#008000',
+    'purple': '#800080',
+    'darkred': '#8B0000',
+    'lightred': '#FFB6C1',
+    'beige': '#F5F5DC',
+    'darkblue': '#00008B',
+    'darkgreen': '#006400',
+    'cadetblue': '#5F9EA0',
+    'darkpurple': '#9400D3',
+    'white': '#FFFFFF',
+    'pink': '#FFC0CB',
+    'lightblue': '#ADD8E6',
+    'gray': '#808080',
+    'black': '#000000',
+    'lightgray': '#D3D3D3'
+}
+
+# Marker clusters by type, with the name folium gives each
+_CLUSTERS = [
+    ('image', 'Images 📷'),
+    ('video', 'Videos 🎥'),
+    ('att_location', 'ATT Location 📍'),
+    ('ankle_monitor', 'Ankle Monitor 📍'),
+]
+
+# Options shared by every marker cluster
+_CLUSTER_OPTIONS = {
+    'spiderfyOnMaxZoom': True,
+    'showCoverageOnHover': True,
+    'zoomToBoundsOnClick': True,
+    'maxClusterRadius': 50,
+    'disableClusteringAtZoom': 18,
+    'spiderfyDistanceMultiplier': 2
+}
+
+# Sidebar item type codes; same order as FILE_TYPES in the sidebar script
+_FILE_TYPE_CODES = {'image': 0, 'video': 1, 'att_location': 2, 'ankle_monitor': 3}
+
+# File items of one time group; compiled once, rendered per group
+_ITEM_TPL = jinja2.Environment(autoescape=False, keep_trailing_newline=True).from_string(
+    '{% for type, i, lat, lon, icon, title in items %}\n'
+    '                        <div class="file-item {{ type }}" data-i="{{ i }}" onclick="flyToMarker({{ lat }}, {{ lon }})">\n'
+    '                            {{ icon }} {{ title }}\n'
+    '                        </div>\n'
+    '{% endfor %}'
+)
+
+# Static sidebar markup, built once at import rather than on every call
+_SIDEBAR_CSS = """
 <style>
     #sidebar {
         position: fixed;
@@ -315,6 +513,28 @@ def add_sidebar_to_html(html_file, df, date_col='date', time_col='time'):
         border-left-color: #ffff00;
     }
     
+    /* Items whose marker is in the Outliers layer, which starts off */
+    .file-item.outlier {
+        border-style: dashed;
+    }
+    
+    .file-item.outlier::after {
+        content: " ⚠️ outlier";
+        color: #b7791f;
+        font-size: 11px;
+    }
+    
+    /* Filter hides: one class on #sidebar per type, mm-hidden per item or group.
+       Class toggles batch the restyle into one layout per filter pass, and
+       display: none leaves no scrollable space behind a long filtered list */
+    #sidebar.hide-image .file-item.image,
+    #sidebar.hide-video .file-item.video,
+    #sidebar.hide-att_location .file-item.att_location,
+    #sidebar.hide-ankle_monitor .file-item.ankle_monitor,
+    .mm-hidden {
+        display: none;
+    }
+    
     .collapsed-content {
         display: none;
     }
@@ -411,7 +631,9 @@ def add_sidebar_to_html(html_file, df, date_col='date', time_col='time'):
         user-select: none;
     }
 </style>
+"""
 
+_SIDEBAR_HEADER_HTML = """
 <div id="sidebar">
     <div id="sidebar-header">
         Location Timeline
@@ -457,78 +679,9 @@ def add_sidebar_to_html(html_file, df, date_col='date', time_col='time'):
                 Clear Time Filter
             </button>
         </div>
-        <div class="stats">
-            <strong>Total Entries:</strong> """ + str(len(df)) + """<br/>
-            <strong>Date Ranges:</strong> """ + str(len(sorted_dates)) + """ days
-        </div>
-"""
-    
-    # Add date groups
-    for date in sorted_dates:
-        times = tree[date]
-        total_files = sum(len(items) for items in times.values())
-        
-        sidebar_html += f"""
-        <div class="date-group">
-            <div class="date-header" onclick="toggleDate('date-{date.replace('/', '-').replace(' ', '_')}')">
-                <span><span class="arrow" id="arrow-date-{date.replace('/', '-').replace(' ', '_')}">▶</span> 📅 {date}</span>
-                <span class="date-count">{total_files} entries</span>
-            </div>
-            <div id="date-{date.replace('/', '-').replace(' ', '_')}" class="collapsed-content">
-"""
-        
-        # Sort times
-        sorted_times = sorted(times.keys())
-        
-        for time_val in sorted_times:
-            items = times[time_val]
-            time_display = time_val if time_val and time_val != 'nan' else 'No Time'
-            time_id = f"{date.replace('/', '-').replace(' ', '_')}-{time_val.replace(':', '-').replace(' ', '_')}"
-            
-            sidebar_html += f"""
-                <div class="time-group">
-                    <div class="time-header" onclick="toggleTime('time-{time_id}')">
-                        <span class="arrow" id="arrow-time-{time_id}">▶</span> 🕐 {time_display} ({len(items)} entries)
-                    </div>
-                    <div id="time-{time_id}" class="collapsed-content">
-"""
-            
-            for item in items:
-                # Determine type from data source or media path
-                data_source = item.get('data_source', 'MediaMarkers')
-                
-                if data_source == 'MasterMapData':
-                    # Event markers
-                    if 'ATT Location' in item['title']:
-                        file_type = 'att_location'
-                        icon = '🟢'
-                    else:
-                        file_type = 'ankle_monitor'
-                        icon = '🟡'
-                else:
-                    # Media markers
-                    file_type = 'video' if any(ext in item['path'].lower() for ext in ['.mp4', '.mov', '.avi', '.wmv']) else 'image'
-                    icon = '🎥' if file_type == 'video' else '📷'
-                
-                datetime_attr = item.get('datetime', '')
-                
-                sidebar_html += f"""
-                        <div class="file-item {file_type}" data-type="{file_type}" data-datetime="{datetime_attr}" data-lat="{item['lat']}" data-lon="{item['lon']}" onclick="flyToMarker({item['lat']}, {item['lon']})">
-                            {icon} {item['title'][:50]}{'...' if len(item['title']) > 50 else ''}
-                        </div>
-"""
-            
-            sidebar_html += """
-                    </div>
-                </div>
-"""
-        
-        sidebar_html += """
-            </div>
-        </div>
 """
-    
-    sidebar_html += """
+
+_SIDEBAR_JS = """
     </div>
 </div>
 
@@ -543,6 +696,14 @@ def add_sidebar_to_html(html_file, df, date_col='date', time_col='time'):
     window.markerMetadata = [];
     window.allMarkers = [];
     
+    // Filter tracing; set window.DEBUG_FILTERS = true in the console to enable.
+    // Logging the Leaflet objects is costly even with devtools closed.
+    function dbg(...args) {
+        if (window.DEBUG_FILTERS) {
+            console.log(...args);
+        }
+    }
+    
     function toggleSidebar() {
         const sidebar = document.getElementById('sidebar');
         const map = document.getElementById('map');
@@ -569,40 +730,132 @@ def add_sidebar_to_html(html_file, df, date_col='date', time_col='time'):
         if (window.map_object) {
             window.map_object.setView([lat, lon], 18);
             
-            // Find and open the popup for this marker
-            // Search in all clusters
-            const clusters = [window.imageCluster, window.videoCluster, window.attCluster, window.ankleCluster];
-            let markerFound = false;
-            
-            clusters.forEach(cluster => {
-                if (cluster && !markerFound) {
-                    cluster.eachLayer(function(layer) {
-                        // Check if this is a marker cluster or individual marker
-                        if (layer.getAllChildMarkers) {
-                            // It's a cluster, check all markers inside
-                            const markers = layer.getAllChildMarkers();
-                            markers.forEach(marker => {
-                                const markerLatLng = marker.getLatLng();
-                                if (Math.abs(markerLatLng.lat - lat) < 0.00001 && Math.abs(markerLatLng.lng - lon) < 0.00001) {
-                                    // Zoom to unclustered view and open popup
-                                    layer.zoomToShowLayer(marker, function() {
-                                        setTimeout(() => marker.openPopup(), 300);
-                                    });
-                                    markerFound = true;
-                                }
-                            });
-                        } else if (layer.getLatLng) {
-                            // It's an individual marker
-                            const markerLatLng = layer.getLatLng();
-                            if (Math.abs(markerLatLng.lat - lat) < 0.00001 && Math.abs(markerLatLng.lng - lon) < 0.00001) {
-                                layer.openPopup();
-                                markerFound = true;
-                            }
-                        }
+            // Look the markers up by the same key as _coord_key() in Python; of those
+            // at this spot, prefer one the filters left on a visible layer
+            const entries = (window.markerByCoord && window.markerByCoord.get(`${lat.toFixed(5)},${lon.toFixed(5)}`)) || [];
+            const entry = entries.find(e => e.cluster.hasLayer(e.marker) && window.map_object.hasLayer(e.cluster))
+                || entries.find(e => e.cluster.hasLayer(e.marker));
+            if (entry) {
+                // The outlier layer starts off; switch it on to show the marker
+                if (entry.cluster === window.outlierCluster && !window.map_object.hasLayer(entry.cluster)) {
+                    window.map_object.addLayer(entry.cluster);
+                }
+                // Zoom to unclustered view and open popup
+                if (window.map_object.hasLayer(entry.cluster)) {
+                    entry.cluster.zoomToShowLayer(entry.marker, function() {
+                        setTimeout(() => entry.marker.openPopup(), 300);
                     });
                 }
-            });
+            }
+        }
+    }
+    
+    // Sidebar items and their filter fields, unpacked from window.MARKERS once,
+    // plus the group elements; nothing in applyFilters queries the DOM
+    const FILE_TYPES = ['image', 'video', 'att_location', 'ankle_monitor'];
+    window.fileItems = [];
+    window.fiTypes = new Uint8Array(0);
+    window.fiTs = new Float64Array(0);
+    window.fiCoords = [];
+    window.fiTimeHidden = new Uint8Array(0);
+    window.timeGroups = [];
+    window.dateGroups = [];
+    
+    // Visible-children counts, kept up to date by delta as items flip
+    window.fiShown = new Uint8Array(0);
+    window.fiGroup = new Uint32Array(0);
+    window.tgDate = new Uint32Array(0);
+    window.tgVisible = new Int32Array(0);
+    window.dgVisible = new Int32Array(0);
+    
+    function cacheFileItems() {
+        const items = Array.from(document.querySelectorAll('.file-item'));
+        window.fileItems = items;
+        window.fiTypes = new Uint8Array(items.length);
+        window.fiTs = new Float64Array(items.length);
+        window.fiCoords = new Array(items.length);
+        window.fiTimeHidden = new Uint8Array(items.length);
+        const M = window.MARKERS;
+        const outlierCoords = window.outlierCoords || new Set();
+        items.forEach((item, i) => {
+            const j = +item.dataset.i;
+            item._i = i;
+            window.fiTypes[i] = M.type[j];
+            window.fiTs[i] = M.ts[j] === null ? NaN : M.ts[j];
+            window.fiCoords[i] = M.coord[j];
+            if (outlierCoords.has(M.coord[j])) {
+                item.classList.add('outlier');
+            }
+        });
+        
+        // The outlier layer starts off, so say on the sidebar what it holds
+        const outlierCount = window.outlierCluster ? window.outlierCluster.getLayers().length : 0;
+        if (outlierCount) {
+            document.getElementById('sidebar').querySelector('.stats').insertAdjacentHTML('beforeend',
+                `<br/><strong>⚠️ Outliers:</strong> ${outlierCount} markers more than ${window.outlierKm} km ` +
+                `from the rest are hidden; turn on "Outliers ⚠️" in the layer control to show them`);
+        }
+        
+        // Group elements, and which group each item / time group belongs to
+        window.timeGroups = Array.from(document.querySelectorAll('.time-group'));
+        window.dateGroups = Array.from(document.querySelectorAll('.date-group'));
+        window.fiGroup = new Uint32Array(items.length);
+        window.tgDate = new Uint32Array(window.timeGroups.length);
+        window.timeGroups.forEach((group, k) => {
+            group._index = k;
+            group.querySelectorAll('.file-item').forEach(item => window.fiGroup[item._i] = k);
+        });
+        window.dateGroups.forEach((group, d) => {
+            group.querySelectorAll('.time-group').forEach(child => window.tgDate[child._index] = d);
+        });
+        
+        // Everything starts out visible
+        window.fiShown = new Uint8Array(items.length).fill(1);
+        window.tgVisible = new Int32Array(window.timeGroups.length);
+        window.dgVisible = new Int32Array(window.dateGroups.length);
+        window.fiGroup.forEach(k => window.tgVisible[k]++);
+        window.tgDate.forEach((d, k) => {
+            if (window.tgVisible[k] > 0) {
+                window.dgVisible[d]++;
+            }
+        });
+    }
+    
+    // Indexes into window.allMarkers of the markers currently in their cluster
+    window.currentlyShown = null;
+    
+    function syncMarkers(isShown) {
+        // Diff against what is shown now and apply it with the bulk
+        // removeLayers/addLayers, instead of clearing and refilling every cluster
+        if (!window.allMarkers) {
+            return;
+        }
+        if (!window.currentlyShown) {
+            window.currentlyShown = new Set(window.allMarkers.keys());
         }
+        // Batched per cluster: outliers of every type share one
+        const toAdd = new Map();
+        const toRemove = new Map();
+        
+        window.allMarkers.forEach((markerInfo, i) => {
+            const show = isShown(markerInfo);
+            if (show === window.currentlyShown.has(i)) {
+                return;
+            }
+            const batch = show ? toAdd : toRemove;
+            if (!batch.has(markerInfo.cluster)) {
+                batch.set(markerInfo.cluster, []);
+            }
+            batch.get(markerInfo.cluster).push(markerInfo.marker);
+            if (show) {
+                window.currentlyShown.add(i);
+            } else {
+                window.currentlyShown.delete(i);
+            }
+        });
+        
+        toRemove.forEach((markers, cluster) => cluster.removeLayers(markers));
+        toAdd.forEach((markers, cluster) => cluster.addLayers(markers));
     }
     
     function clearTimeFilter() {
@@ -613,6 +866,20 @@ def add_sidebar_to_html(html_file, df, date_col='date', time_col='time'):
     
     
     function applyFilters() {
+        // Coalesce bursts of filter changes into one pass per frame
+        if (window._filterFrame) {
+            return;
+        }
+        window._filterFrame = requestAnimationFrame(function() {
+            window._filterFrame = 0;
+            const state = computeFilters();
+            filterMarkers(state);
+            commitFilters(state);
+        });
+    }
+    
+    function computeFilters() {
+        // Read phase: inputs and cached arrays only, no DOM writes
         // Determine which filter is selected
         const showBoth = document.getElementById('filter-both').checked;
         const showImages = document.getElementById('filter-images').checked;
@@ -624,83 +891,85 @@ def add_sidebar_to_html(html_file, df, date_col='date', time_col='time'):
         const timeStart = document.getElementById('time-filter-start').value;
         const timeEnd = document.getElementById('time-filter-end').value;
         
-        console.log('Applying filters:', {showBoth, showImages, showVideos, showATT, showAnkle, timeStart, timeEnd});
-        console.log('Map object:', window.map_object);
-        console.log('Image cluster:', window.imageCluster);
-        console.log('Video cluster:', window.videoCluster);
-        console.log('ATT cluster:', window.attCluster);
-        console.log('Ankle cluster:', window.ankleCluster);
+        // data-ts is wall-clock time counted as UTC, so read the inputs the same way
+        const startTs = timeStart ? Date.parse(timeStart + 'Z') : -Infinity;
+        const endTs = timeEnd ? Date.parse(timeEnd + 'Z') : Infinity;
+        
+        // Which file types pass, indexed like FILE_TYPES
+        const typeShown = [showBoth || showImages, showBoth || showVideos, showATT, showAnkle];
+        const typeShownByName = {};
+        FILE_TYPES.forEach((type, k) => typeShownByName[type] = typeShown[k]);
+        
+        // Decide every sidebar item in one pass over the cached arrays; items
+        // without a timestamp are NaN, which never fails a time comparison
+        const fiTypes = window.fiTypes;
+        const fiTs = window.fiTs;
+        const fiShown = window.fiShown;
+        const fiGroup = window.fiGroup;
+        const tgVisible = window.tgVisible;
+        const dgVisible = window.dgVisible;
+        const timeShown = new Uint8Array(fiTypes.length);
+        const itemShown = new Uint8Array(fiTypes.length);
+        for (let i = 0; i < fiTypes.length; i++) {
+            timeShown[i] = !(fiTs[i] < startTs) && !(fiTs[i] > endTs) ? 1 : 0;
+            itemShown[i] = typeShown[fiTypes[i]] && timeShown[i] ? 1 : 0;
+            
+            // Push any change into the group counts, and from there the date counts
+            const delta = itemShown[i] - fiShown[i];
+            if (delta) {
+                const k = fiGroup[i];
+                const wasVisible = tgVisible[k] > 0;
+                tgVisible[k] += delta;
+                if (wasVisible !== tgVisible[k] > 0) {
+                    dgVisible[window.tgDate[k]] += wasVisible ? -1 : 1;
+                }
+                fiShown[i] = itemShown[i];
+            }
+        }
+        
+        // Empty groups are hidden; the odd images/videos clause is kept from
+        // the original rule and is always true with the radio buttons
+        const hideEmpty = !showImages || !showVideos;
+        const timeGroupShown = tgVisible.map(count => !hideEmpty || count > 0 ? 1 : 0);
+        const dateGroupShown = dgVisible.map(count => !hideEmpty || count > 0 ? 1 : 0);
+        
+        return {
+            showBoth, showImages, showVideos, showATT, showAnkle, timeStart, timeEnd,
+            typeShown, typeShownByName, timeShown, itemShown, timeGroupShown, dateGroupShown
+        };
+    }
+    
+    function filterMarkers(state) {
+        const {showBoth, showImages, showVideos, showATT, showAnkle, timeStart, timeEnd, typeShownByName, itemShown} = state;
+        
+        dbg('Applying filters:', {showBoth, showImages, showVideos, showATT, showAnkle, timeStart, timeEnd});
+        dbg('Map object:', window.map_object);
+        dbg('Image cluster:', window.imageCluster);
+        dbg('Video cluster:', window.videoCluster);
+        dbg('ATT cluster:', window.attCluster);
+        dbg('Ankle cluster:', window.ankleCluster);
         
         // Store filtered coordinates for map filtering
         const filteredCoords = new Set();
         
         // Control marker clusters visibility using stored references
         if (window.map_object && window.imageCluster && window.videoCluster && window.attCluster && window.ankleCluster) {
-            console.log('All objects found, applying filters...');
+            dbg('All objects found, applying filters...');
             
             // If time filter is active, we need to filter individual markers
             if (timeStart || timeEnd) {
                 // First, collect all coordinates that pass the time filter
-                const allFiles = document.querySelectorAll('.file-item');
-                allFiles.forEach(item => {
-                    const type = item.getAttribute('data-type');
-                    const itemDateTime = item.getAttribute('data-datetime');
-                    const lat = item.getAttribute('data-lat');
-                    const lon = item.getAttribute('data-lon');
-                    
-                    // Check media type filter
-                    let typeMatch = showBoth || (type === 'image' && showImages) || (type === 'video' && showVideos);
-                    
-                    // Check event type filter
-                    if (type === 'att_location') {
-                        typeMatch = showATT;
-                    } else if (type === 'ankle_monitor') {
-                        typeMatch = showAnkle;
+                for (let i = 0; i < itemShown.length; i++) {
+                    if (itemShown[i]) {
+                        filteredCoords.add(window.fiCoords[i]);
                     }
-                    
-                    // Check time filter
-                    let timeMatch = true;
-                    if (itemDateTime && (timeStart || timeEnd)) {
-                        const itemDate = new Date(itemDateTime);
-                        if (timeStart && itemDate < new Date(timeStart)) {
-                            timeMatch = false;
-                        }
-                        if (timeEnd && itemDate > new Date(timeEnd)) {
-                            timeMatch = false;
-                        }
-                    }
-                    
-                    if (typeMatch && timeMatch) {
-                        filteredCoords.add(`${lat},${lon}`);
-                    }
-                });
+                }
                 
                 // Now filter markers in all clusters
-                console.log('Filtering markers by time, found', filteredCoords.size, 'matching coordinates');
-                
-                // Remove all markers first
-                window.imageCluster.clearLayers();
-                window.videoCluster.clearLayers();
-                window.attCluster.clearLayers();
-                window.ankleCluster.clearLayers();
+                dbg('Filtering markers by time, found', filteredCoords.size, 'matching coordinates');
                 
-                // Re-add only matching markers
-                if (window.allMarkers) {
-                    window.allMarkers.forEach(markerInfo => {
-                        const coordKey = `${markerInfo.lat},${markerInfo.lon}`;
-                        if (filteredCoords.has(coordKey)) {
-                            if (markerInfo.type === 'image' && (showImages || showBoth)) {
-                                markerInfo.marker.addTo(window.imageCluster);
-                            } else if (markerInfo.type === 'video' && (showVideos || showBoth)) {
-                                markerInfo.marker.addTo(window.videoCluster);
-                            } else if (markerInfo.type === 'att_location' && showATT) {
-                                markerInfo.marker.addTo(window.attCluster);
-                            } else if (markerInfo.type === 'ankle_monitor' && showAnkle) {
-                                markerInfo.marker.addTo(window.ankleCluster);
-                            }
-                        }
-                    });
-                }
+                // Keep only matching markers in their clusters
+                syncMarkers(markerInfo => typeShownByName[markerInfo.type] && filteredCoords.has(markerInfo.coord));
                 
                 // Ensure all clusters are on the map
                 if (!window.map_object.hasLayer(window.imageCluster)) {
@@ -716,36 +985,20 @@ def add_sidebar_to_html(html_file, df, date_col='date', time_col='time'):
                     window.map_object.addLayer(window.ankleCluster);
                 }
             } else {
-                // No time filter - just use type filter
-                // Populate filteredCoords with all markers that match type filters
-                if (window.allMarkers) {
-                    window.allMarkers.forEach(markerInfo => {
-                        let shouldShow = false;
-                        if (markerInfo.type === 'image' && (showImages || showBoth)) {
-                            shouldShow = true;
-                        } else if (markerInfo.type === 'video' && (showVideos || showBoth)) {
-                            shouldShow = true;
-                        } else if (markerInfo.type === 'att_location' && showATT) {
-                            shouldShow = true;
-                        } else if (markerInfo.type === 'ankle_monitor' && showAnkle) {
-                            shouldShow = true;
-                        }
-                        
-                        if (shouldShow) {
-                            filteredCoords.add(`${markerInfo.lat},${markerInfo.lon}`);
-                        }
-                    });
-                }
+                // No time filter - put back markers an earlier time filter took out;
+                // outliers share a cluster, so their type filter is per marker
+                syncMarkers(markerInfo => !markerInfo.outlier || typeShownByName[markerInfo.type]);
                 
+                // Then just use type filter
                 // Handle image cluster
                 if (showImages || showBoth) {
                     if (!window.map_object.hasLayer(window.imageCluster)) {
-                        console.log('Adding image cluster to map');
+                        dbg('Adding image cluster to map');
                         window.map_object.addLayer(window.imageCluster);
                     }
                 } else {
                     if (window.map_object.hasLayer(window.imageCluster)) {
-                        console.log('Removing image cluster from map');
+                        dbg('Removing image cluster from map');
                         window.map_object.removeLayer(window.imageCluster);
                     }
                 }
@@ -753,12 +1006,12 @@ def add_sidebar_to_html(html_file, df, date_col='date', time_col='time'):
                 // Handle video cluster
                 if (showVideos || showBoth) {
                     if (!window.map_object.hasLayer(window.videoCluster)) {
-                        console.log('Adding video cluster to map');
+                        dbg('Adding video cluster to map');
                         window.map_object.addLayer(window.videoCluster);
                     }
                 } else {
                     if (window.map_object.hasLayer(window.videoCluster)) {
-                        console.log('Removing video cluster from map');
+                        dbg('Removing video cluster from map');
                         window.map_object.removeLayer(window.videoCluster);
                     }
                 }
@@ -766,12 +1019,12 @@ def add_sidebar_to_html(html_file, df, date_col='date', time_col='time'):
                 // Handle ATT cluster
                 if (showATT) {
                     if (!window.map_object.hasLayer(window.attCluster)) {
-                        console.log('Adding ATT cluster to map');
+                        dbg('Adding ATT cluster to map');
                         window.map_object.addLayer(window.attCluster);
                     }
                 } else {
                     if (window.map_object.hasLayer(window.attCluster)) {
-                        console.log('Removing ATT cluster from map');
+                        dbg('Removing ATT cluster from map');
                         window.map_object.removeLayer(window.attCluster);
                     }
                 }
@@ -779,12 +1032,12 @@ def add_sidebar_to_html(html_file, df, date_col='date', time_col='time'):
                 // Handle ankle monitor cluster
                 if (showAnkle) {
                     if (!window.map_object.hasLayer(window.ankleCluster)) {
-                        console.log('Adding ankle monitor cluster to map');
+                        dbg('Adding ankle monitor cluster to map');
                         window.map_object.addLayer(window.ankleCluster);
                     }
                 } else {
                     if (window.map_object.hasLayer(window.ankleCluster)) {
-                        console.log('Removing ankle monitor cluster from map');
+                        dbg('Removing ankle monitor cluster from map');
                         window.map_object.removeLayer(window.ankleCluster);
                     }
                 }
@@ -792,84 +1045,35 @@ def add_sidebar_to_html(html_file, df, date_col='date', time_col='time'):
         } else {
             console.warn('Missing required objects for filtering');
         }
+    }
+    
+    function commitFilters(state) {
+        // Write phase: class toggles only, from the bits computeFilters worked out
+        const {typeShown, timeShown, timeGroupShown, dateGroupShown} = state;
         
-        // Update sidebar items visibility
-        const allFiles = document.querySelectorAll('.file-item');
-        let visibleCount = 0;
-        
-        allFiles.forEach(item => {
-            const type = item.getAttribute('data-type');
-            const itemDateTime = item.getAttribute('data-datetime');
-            
-            // Check media type filter
-            let typeMatch = showBoth || (type === 'image' && showImages) || (type === 'video' && showVideos);
-            
-            // Check event type filter
-            if (type === 'att_location') {
-                typeMatch = showATT;
-            } else if (type === 'ankle_monitor') {
-                typeMatch = showAnkle;
-            }
-            
-            // Check time filter
-            let timeMatch = true;
-            if (itemDateTime && (timeStart || timeEnd)) {
-                const itemDate = new Date(itemDateTime);
-                if (timeStart && itemDate < new Date(timeStart)) {
-                    timeMatch = false;
-                }
-                if (timeEnd && itemDate > new Date(timeEnd)) {
-                    timeMatch = false;
-                }
-            }
-            
-            const shouldShow = typeMatch && timeMatch;
-            
-            if (shouldShow) {
-                item.style.display = 'block';
-                visibleCount++;
-            } else {
-                item.style.display = 'none';
-            }
-        });
-        
-        // Update stats
-        document.getElementById('visible-count').textContent = visibleCount;
-        document.getElementById('total-count').textContent = allFiles.length;
-        
-        // Hide empty time groups
-        const timeGroups = document.querySelectorAll('.time-group');
-        timeGroups.forEach(group => {
-            const visibleFiles = group.querySelectorAll('.file-item[style="display: block;"], .file-item:not([style*="display: none"])');
-            if (visibleFiles.length === 0 && (!showImages || !showVideos)) {
-                group.style.display = 'none';
-            } else {
-                group.style.display = 'block';
-            }
-        });
+        // Update sidebar items visibility: type hides are a class on the
+        // sidebar itself, and only items whose time state flipped are touched
+        const sidebar = document.getElementById('sidebar');
+        FILE_TYPES.forEach((type, k) => sidebar.classList.toggle('hide-' + type, !typeShown[k]));
         
-        // Hide empty date groups
-        const dateGroups = document.querySelectorAll('.date-group');
-        dateGroups.forEach(group => {
-            const visibleTimeGroups = group.querySelectorAll('.time-group[style="display: block;"], .time-group:not([style*="display: none"])');
-            if (visibleTimeGroups.length === 0 && (!showImages || !showVideos)) {
-                group.style.display = 'none';
-            } else {
-                group.style.display = 'block';
+        const allFiles = window.fileItems;
+        const timeHidden = window.fiTimeHidden;
+        allFiles.forEach((item, i) => {
+            const hidden = timeShown[i] ? 0 : 1;
+            if (hidden !== timeHidden[i]) {
+                item.classList.toggle('mm-hidden', hidden === 1);
+                timeHidden[i] = hidden;
             }
         });
         
+        // Hide empty time and date groups
+        window.timeGroups.forEach((group, k) => group.classList.toggle('mm-hidden', !timeGroupShown[k]));
+        window.dateGroups.forEach((group, k) => group.classList.toggle('mm-hidden', !dateGroupShown[k]));
     }
     
-    // Store map object globally
+    // window.map_object is set by the injected map script
     document.addEventListener('DOMContentLoaded', function() {
-        // Find the map object in the page
-        for (let key in window) {
-            if (key.startsWith('map_') && window[key].setView) {
-                window.map_object = window[key];
-                break;
-            }
-        }
+        cacheFileItems();
         
         // Wait a bit for clusters to be fully loaded, then initialize
         setTimeout(function() {
@@ -878,16 +1082,373 @@ def add_sidebar_to_html(html_file, df, date_col='date', time_col='time'):
     });
 </script>
 """
+
+def _sidebar_chunks(df, date_col='date', time_col='time'):
+    """
+    Yield the sidebar markup piece by piece, in document order.
+    """
     
-    # Insert sidebar before the map div
-    html_content = html_content.replace(
-        '<div class="folium-map"',
-        sidebar_html + '<div class="folium-map"'
-    )
+    # Sort dataframe by datetime column for chronological order; assign()
+    # adds the parsed column without copying the caller's frame first
+    if 'datetime' in df.columns:
+        df_sorted = df.assign(datetime=pd.to_datetime(df['datetime'], errors='coerce'))
+        df_sorted = df_sorted.sort_values('datetime', kind='mergesort')
+        dt = df_sorted['datetime']
+        # Keep the local wall-clock time of offset timestamps; the filter treats it as UTC
+        if dt.dt.tz is not None:
+            dt = dt.dt.tz_localize(None)
+    else:
+        df_sorted = df
+        dt = pd.Series(pd.NaT, index=df_sorted.index, dtype='datetime64[ns]')
+    
+    # Derive every per-row field as a whole column; rows with a parsed
+    # datetime use its date/time, the rest fall back to the raw columns
+    dates = dt.dt.strftime('%Y-%m-%d').fillna(_str_column(df_sorted, date_col, 'Unknown Date'))
+    times = dt.dt.strftime('%H:%M:%S').fillna(_str_column(df_sorted, time_col, ''))
+    # Epoch milliseconds of the naive wall-clock time, so the browser compares numbers
+    ts = (dt - pd.Timestamp(0)) // pd.Timedelta(milliseconds=1)
+    timestamps = ts.fillna(-1).astype('int64').astype(object).where(ts.notna(), None)
+    titles = _str_column(df_sorted, 'title', 'Untitled')
+    titles_display = titles.where(titles.str.len() <= 50, titles.str[:50] + '...')
+    paths = _str_column(df_sorted, 'media_path', '')
+    lats = df_sorted['latitude'] if 'latitude' in df_sorted.columns else pd.Series(0, index=df_sorted.index)
+    lons = df_sorted['longitude'] if 'longitude' in df_sorted.columns else pd.Series(0, index=df_sorted.index)
+    sources = _str_column(df_sorted, 'data_source', 'MediaMarkers')
+    
+    # Canonical coordinate key, formatted exactly like _coord_key() on the markers
+    coords = (pd.to_numeric(lats, errors='coerce').map('{:.5f}'.format) + ','
+              + pd.to_numeric(lons, errors='coerce').map('{:.5f}'.format))
+    
+    # Classify every row once: event marker vs. media, and video vs. image
+    is_master = (sources == 'MasterMapData').to_numpy()
+    is_video = paths.str.lower().str.contains(r'\.(?:mp4|mov|avi|wmv)', regex=True).to_numpy()
+    is_att = is_master & titles.str.contains('ATT Location', regex=False).to_numpy()
+    
+    # Pick type and icon for every row at once; first matching condition wins
+    conds = [is_att, is_master, is_video]
+    type_names = ['att_location', 'ankle_monitor', 'video']
+    file_types = np.select(conds, type_names, default='image')
+    type_codes = np.select(conds, [_FILE_TYPE_CODES[t] for t in type_names], default=_FILE_TYPE_CODES['image'])
+    icons = np.select(conds, ['🟢', '🟡', '🎥'], default='📷')
+    
+    # One frame of exactly the fields the sidebar needs, in unpacking order
+    rows = pd.DataFrame({
+        'date': dates, 'time': times, 'title': titles, 'title_display': titles_display,
+        'lat': lats, 'lon': lons, 'coord': coords, 'ts': timestamps,
+        'file_type': file_types, 'type_code': type_codes, 'icon': icons,
+    }, index=df_sorted.index)
+    rows = rows[(rows['date'] != '') & (rows['date'] != 'nan')]
+    
+    # Dates keep first-seen (chronological) order from the sorted dataframe
+    date_groups = rows.groupby('date', sort=False)
+    
+    # Build sidebar HTML with professional styling
+    yield _SIDEBAR_CSS
+    yield _SIDEBAR_HEADER_HTML
+    yield f"""        <div class="stats">
+            <strong>Total Entries:</strong> {len(df)}<br/>
+            <strong>Date Ranges:</strong> {date_groups.ngroups} days
+        </div>
+"""
+    
+    # Per-item filter fields, emitted once as window.MARKERS; items carry only data-i
+    item_types = []
+    item_ts = []
+    item_coords = []
     
-    # Write back to file
-    with open(html_file, 'w', encoding='utf-8') as f:
-        f.write(html_content)
+    # Add date groups
+    for date, date_rows in date_groups:
+        date_id = date.translate(_SLUG_TABLE)
+        
+        yield f"""
+        <div class="date-group">
+            <div class="date-header" onclick="toggleDate('date-{date_id}')">
+                <span><span class="arrow" id="arrow-date-{date_id}">▶</span> 📅 {date}</span>
+                <span class="date-count">{len(date_rows)} entries</span>
+            </div>
+            <div id="date-{date_id}" class="collapsed-content">
+"""
+        
+        # Times sorted within each date
+        for time_val, items in date_rows.groupby('time', sort=True):
+            time_display = time_val if time_val and time_val != 'nan' else 'No Time'
+            time_id = f"{date_id}-{time_val.translate(_SLUG_TABLE)}"
+            
+            yield f"""
+                <div class="time-group">
+                    <div class="time-header" onclick="toggleTime('time-{time_id}')">
+                        <span class="arrow" id="arrow-time-{time_id}">▶</span> 🕐 {time_display} ({len(items)} entries)
+                    </div>
+                    <div id="time-{time_id}" class="collapsed-content">
+"""
+            
+            group_items = []
+            for file_type, type_code, icon, title_display, lat, lon, coord, ts in items[
+                ['file_type', 'type_code', 'icon', 'title_display', 'lat', 'lon', 'coord', 'ts']
+            ].itertuples(index=False, name=None):
+                item_types.append(type_code)
+                item_ts.append(ts)
+                item_coords.append(coord)
+                group_items.append((file_type, len(item_coords) - 1, lat, lon, icon, title_display))
+            
+            yield _ITEM_TPL.render(items=group_items)
+            
+            yield """
+                    </div>
+                </div>
+"""
+        
+        yield """
+            </div>
+        </div>
+"""
+    
+    markers_json = _dumps({'type': item_types, 'ts': item_ts, 'coord': item_coords})
+    yield f"""
+        <script>window.MARKERS = {markers_json};</script>
+"""
+    
+    yield _SIDEBAR_JS
+
+
+def _sidebar_cache_key(df, date_col, time_col):
+    """Hash of everything the sidebar markup depends on"""
+    key = hashlib.blake2b(digest_size=16)
+    key.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    key.update(repr((list(df.columns), date_col, time_col)).encode())
+    key.update(_CODE_VERSION)
+    return key.hexdigest()
+
+
+def _prune_sidebar_cache(keep=SIDEBAR_CACHE_KEEP):
+    """Delete all but the keep most recently used sidebar fragments"""
+    entries = []
+    for cache_file in SIDEBAR_CACHE_DIR.glob('sidebar-*.html'):
+        try:
+            entries.append((cache_file.stat().st_mtime_ns, cache_file))
+        except OSError:
+            pass
+    entries.sort(reverse=True)
+    for _, cache_file in entries[keep:]:
+        try:
+            cache_file.unlink()
+        except OSError:
+            pass
+
+
+def _write_html(path, pieces, df, date_col, time_col, use_cache=True):
+    """
+    Write the page pieces (any iterable of strings) to path with the sidebar
+    inserted before the map div.
+    
+    Sidebar chunks are streamed into the file as they are generated. With
+    use_cache, the sidebar for an unchanged dataframe is reused from
+    SIDEBAR_CACHE_DIR, which keeps the SIDEBAR_CACHE_KEEP most recent. A gzipped copy of the page is written to path + '.gz'.
+    """
+    
+    with open(path, 'w', encoding='utf-8', buffering=1 << 20) as f:
+        inserted = False
+        for piece in pieces:
+            if inserted:
+                f.write(piece)
+                continue
+            head, marker, tail = piece.partition('<div class="folium-map"')
+            f.write(head)
+            if marker and use_cache:
+                cache_file = SIDEBAR_CACHE_DIR / f"sidebar-{_sidebar_cache_key(df, date_col, time_col)}.html"
+                if cache_file.exists():
+                    f.write(cache_file.read_text(encoding='utf-8'))
+                    os.utime(cache_file)  # mark as recently used for pruning
+                else:
+                    # Tee the chunks into the cache; rename only once it is complete
+                    SIDEBAR_CACHE_DIR.mkdir(exist_ok=True)
+                    tmp_file = cache_file.with_suffix('.tmp')
+                    with open(tmp_file, 'w', encoding='utf-8', newline='', buffering=1 << 20) as cache:
+                        for chunk in _sidebar_chunks(df, date_col, time_col):
+                            f.write(chunk)
+                            cache.write(chunk)
+                    os.replace(tmp_file, cache_file)
+                    _prune_sidebar_cache()
+            elif marker:
+                for chunk in _sidebar_chunks(df, date_col, time_col):
+                    f.write(chunk)
+            inserted = bool(marker)
+            f.write(marker)
+            f.write(tail)
+    
+    # The servers send this copy to browsers that accept gzip
+    with open(path, 'rb') as src, gzip.open(f"{path}.gz", 'wb', compresslevel=9) as dst:
+        shutil.copyfileobj(src, dst, 1 << 20)
+
+
+def add_sidebar_to_html(html_file, df, date_col='date', time_col='time', output_file=None, use_cache=True):
+    """
+    Add a collapsible sidebar with file tree organized chronologically by datetime.
+    
+    The result is written to output_file (html_file by default); sidebar
+    chunks are streamed into the file as they are generated. With use_cache,
+    the sidebar for an unchanged dataframe is reused from SIDEBAR_CACHE_DIR.
+    """
+    
+    # Read the HTML file
+    with open(html_file, 'r', encoding='utf-8') as f:
+        html_content = f.read()
+    
+    _write_html(output_file or html_file, [html_content], df, date_col, time_col, use_cache)
+
+
+def _process_html(map_html, marker_data):
+    """
+    Yield the folium page in pieces, with the cluster-reference script and
+    the marker rows injected after the clusters are added to the map.
+    
+    The page is yielded whole if the cluster variables cannot be found.
+    """
+    
+    # Find the variable names that Folium assigned to our clusters
+    cluster_decls = list(_CLUSTER_VAR_RE.finditer(map_html))
+    cluster_matches = [match.group(1) for match in cluster_decls]
+    if len(cluster_matches) < 4:
+        yield map_html
+        return
+    
+    # Find the accuracy group feature group variable
+    feature_group_matches = _FEATURE_GROUP_VAR_RE.findall(map_html)
+    accuracy_group_var = feature_group_matches[0] if feature_group_matches else None
+    
+    # Assume first is images, second is videos, third is ATT, fourth is ankle monitor
+    image_cluster_var = cluster_matches[0]
+    video_cluster_var = cluster_matches[1]
+    att_cluster_var = cluster_matches[2]
+    ankle_cluster_var = cluster_matches[3]
+    outlier_cluster_var = cluster_matches[4] if len(cluster_matches) > 4 else None
+    
+    # Find the map variable name
+    map_var_matches = _MAP_VAR_RE.findall(map_html)
+    map_var = map_var_matches[0] if map_var_matches else 'map'
+    
+    # Inject right after the last occurrence of the ankle cluster being
+    # added to the map (.addTo(map_xxxxx);), or after the last cluster
+    # declaration if that comes later, as a hidden cluster's does
+    last_addto_pos = map_html.rfind(f'{ankle_cluster_var}.addTo')
+    if last_addto_pos == -1:
+        yield map_html
+        return
+    semicolon_pos = map_html.find(';', max(last_addto_pos, cluster_decls[-1].end()))
+    if semicolon_pos == -1:
+        yield map_html
+        return
+    
+    injection_head = f"""
+        
+        // Store cluster references globally for filtering
+        window.imageCluster = {image_cluster_var};
+        window.videoCluster = {video_cluster_var};
+        window.attCluster = {att_cluster_var};
+        window.ankleCluster = {ankle_cluster_var};
+        window.accuracyGroup = {accuracy_group_var if accuracy_group_var else 'null'};
+        window.map_object = {map_var};
+        
+        // Marker rows per type: [lat, lon, coord, datetime, title, popup, color, icon],
+        // plus the marker type on outlier rows
+        var markerRows = """
+    
+    injection_tail = f""";
+        
+        function makeMarker(row) {{
+            var marker = L.marker([row[0], row[1]], {{
+                icon: L.AwesomeMarkers.icon({{
+                    markerColor: row[6],
+                    iconColor: 'white',
+                    icon: row[7],
+                    prefix: 'fa',
+                    extraClasses: 'fa-rotate-0'
+                }})
+            }});
+            marker.bindPopup('<div style="width: 100.0%; height: 100.0%;">' + row[5] + '</div>', {{maxWidth: 600}});
+            marker.bindTooltip('<div>' + row[4] + '</div>', {{sticky: true}});
+            return marker;
+        }}
+        
+        // Create the markers in bulk and build allMarkers as they are made
+        window.allMarkers = [];
+        // coord key -> every marker there and its cluster, for flyToMarker
+        window.markerByCoord = new Map();
+        function indexMarker(coord, marker, cluster) {{
+            var entries = window.markerByCoord.get(coord);
+            if (!entries) {{
+                entries = [];
+                window.markerByCoord.set(coord, entries);
+            }}
+            entries.push({{marker: marker, cluster: cluster}});
+        }}
+        [
+            [{image_cluster_var}, 'image'],
+            [{video_cluster_var}, 'video'],
+            [{att_cluster_var}, 'att_location'],
+            [{ankle_cluster_var}, 'ankle_monitor']
+        ].forEach(function(entry) {{
+            var cluster = entry[0];
+            var type = entry[1];
+            var markers = markerRows[type].map(function(row) {{
+                var marker = makeMarker(row);
+                window.allMarkers.push({{
+                    marker: marker,
+                    lat: row[0],
+                    lon: row[1],
+                    coord: row[2],
+                    type: type,
+                    datetime: row[3],
+                    cluster: cluster
+                }});
+                indexMarker(row[2], marker, cluster);
+                return marker;
+            }});
+            cluster.addLayers(markers);
+        }});
+        
+        // Outliers sit in their own cluster, off until switched on in the layer
+        // control; the sidebar filters apply to them marker by marker
+        window.outlierCluster = {outlier_cluster_var or 'null'};
+        window.outlierCoords = new Set(markerRows.outlier.map(function(row) {{ return row[2]; }}));
+        window.outlierKm = {OUTLIER_DISTANCE_KM};
+        if (window.outlierCluster) {{
+            window.outlierCluster.addLayers(markerRows.outlier.map(function(row) {{
+                var marker = makeMarker(row);
+                window.allMarkers.push({{
+                    marker: marker,
+                    lat: row[0],
+                    lon: row[1],
+                    coord: row[2],
+                    type: row[8],
+                    datetime: row[3],
+                    cluster: window.outlierCluster,
+                    outlier: true
+                }});
+                indexMarker(row[2], marker, window.outlierCluster);
+                return marker;
+            }}));
+        }}
+"""
+    
+    yield map_html[:semicolon_pos + 1]
+    yield injection_head
+    yield from _marker_rows_chunks(marker_data)
+    yield injection_tail
+    yield map_html[semicolon_pos + 1:]
+
+
+def _marker_rows_chunks(marker_data, batch=1000):
+    """The markerRows object in JSON, rows already serialized by the marker loop joined batch at a time"""
+    yield '{'
+    for i, (marker_type, rows) in enumerate(marker_data.items()):
+        yield f'{"," if i else ""}"{marker_type}":['
+        # One write per batch rather than per row, without joining a whole type at once
+        for start in range(0, len(rows), batch):
+            yield (',' if start else '') + ','.join(rows[start:start + batch])
+        yield ']'
+    yield '}'
+
 
 
 def create_html_map(
@@ -949,7 +1510,13 @@ def create_html_map(
     master_data_path = Path("MasterMapData.csv")
     if master_data_path.exists():
         print(f"\n📂 Loading MasterMapData.csv...")
-        master_df = pd.read_csv(master_data_path)
+        # All columns are kept: the ones not mapped below show up in popups
+        master_columns = pd.read_csv(master_data_path, nrows=0).columns
+        master_df = pd.read_csv(
+            master_data_path,
+            engine='c',
+            dtype={col: dtype for col, dtype in MASTER_DTYPES.items() if col in master_columns}
+        )
         print(f"   Total rows: {len(master_df)}")
         
         # Normalize column names and prepare master data
@@ -990,9 +1557,27 @@ def create_html_map(
         print(f"❌ Error: No valid coordinates found in columns '{lat_col}' and '{lon_col}'")
         return None
     
+    # Flag outliers by distance from the medoid, then center on the rest
+    lats = pd.to_numeric(df[lat_col], errors='coerce')
+    lons = pd.to_numeric(df[lon_col], errors='coerce')
+    outliers = pd.Series(False, index=df.index)
+    medoid = _medoid(lats.to_numpy(dtype=float), lons.to_numpy(dtype=float))
+    if medoid is not None:
+        distances = _haversine_km(lats.to_numpy(dtype=float), lons.to_numpy(dtype=float), *medoid)
+        far = distances > OUTLIER_DISTANCE_KM
+        # As many far points as near ones is data from several places, not outliers
+        if far.sum() * 2 < len(far):
+            outliers = pd.Series(far, index=df.index)
+    if outliers.any():
+        print(f"   Outliers (> {OUTLIER_DISTANCE_KM} km from the most central point): {outliers.sum()}")
+    
     # Calculate map center
-    center_lat = df[lat_col].mean()
-    center_lon = df[lon_col].mean()
+    if outliers.all():
+        center_lat = df[lat_col].mean()
+        center_lon = df[lon_col].mean()
+    else:
+        center_lat = lats[~outliers].mean()
+        center_lon = lons[~outliers].mean()
     
     print(f"\n📍 Creating map centered at: {center_lat:.6f}, {center_lon:.6f}")
     
@@ -1024,119 +1609,27 @@ def create_html_map(
         control=True
     ).add_to(m)
     
-    # Create separate feature groups for images and videos
-    from folium import FeatureGroup
-    
-    image_cluster = MarkerCluster(
-        name='Images 📷',
-        overlay=True,
-        control=False,  # We'll control this via our custom filters
-        icon_create_function=None,
-        options={
-            'spiderfyOnMaxZoom': True,
-            'showCoverageOnHover': True,
-            'zoomToBoundsOnClick': True,
-            'maxClusterRadius': 50,
-            'disableClusteringAtZoom': 18,
-            'spiderfyDistanceMultiplier': 2
-        }
-    )
-    
-    video_cluster = MarkerCluster(
-        name='Videos 🎥',
-        overlay=True,
-        control=False,  # We'll control this via our custom filters
-        icon_create_function=None,
-        options={
-            'spiderfyOnMaxZoom': True,
-            'showCoverageOnHover': True,
-            'zoomToBoundsOnClick': True,
-            'maxClusterRadius': 50,
-            'disableClusteringAtZoom': 18,
-            'spiderfyDistanceMultiplier': 2
-        }
-    )
-    
-    # Create clusters for event markers
-    att_cluster = MarkerCluster(
-        name='ATT Location 📍',
-        overlay=True,
-        control=False,
-        icon_create_function=None,
-        options={
-            'spiderfyOnMaxZoom': True,
-            'showCoverageOnHover': True,
-            'zoomToBoundsOnClick': True,
-            'maxClusterRadius': 50,
-            'disableClusteringAtZoom': 18,
-            'spiderfyDistanceMultiplier': 2
-        }
-    )
+    # One cluster per marker type, in the order _process_html expects; they
+    # are left out of the layer control and driven by the sidebar filters
+    clusters = {
+        marker_type: MarkerCluster(name=name, overlay=True, control=False,
+                                   icon_create_function=None, options=_CLUSTER_OPTIONS)
+        for marker_type, name in _CLUSTERS
+    }
     
-    ankle_cluster = MarkerCluster(
-        name='Ankle Monitor 📍',
-        overlay=True,
-        control=False,
-        icon_create_function=None,
-        options={
-            'spiderfyOnMaxZoom': True,
-            'showCoverageOnHover': True,
-            'zoomToBoundsOnClick': True,
-            'maxClusterRadius': 50,
-            'disableClusteringAtZoom': 18,
-            'spiderfyDistanceMultiplier': 2
-        }
-    )
+    # Far-off markers; off until switched on in the layer control
+    outlier_cluster = MarkerCluster(name='Outliers ⚠️', overlay=True, control=True, show=False,
+                                    icon_create_function=None, options=_CLUSTER_OPTIONS)
     
     # Create feature group for accuracy circles
     from folium import FeatureGroup
     accuracy_group = FeatureGroup(name='Accuracy Circles', overlay=True, control=False)
     
-    image_cluster.add_to(m)
-    video_cluster.add_to(m)
-    att_cluster.add_to(m)
-    ankle_cluster.add_to(m)
+    for cluster in clusters.values():
+        cluster.add_to(m)
+    outlier_cluster.add_to(m)
     accuracy_group.add_to(m)
     
-    # Color mapping for markers
-    color_map = {
-        'red': 'red',
-        'blue': 'blue',
-        'green': 'green',
-        'purple': 'purple',
-        'orange': 'orange',
-        'darkred': 'darkred',
-        'lightred': 'lightred',
-        'beige': 'beige',
-        'darkblue': 'darkblue',
-        'darkgreen': 'darkgreen',
-        'cadetblue': 'cadetblue',
-        'darkpurple': 'darkpurple',
-        'white': 'white',
-        'pink': 'pink',
-        'lightblue': 'lightblue',
-        'lightgreen': 'lightgreen',
-        'gray': 'gray',
-        'black': 'black',
-        'lightgray': 'lightgray'
-    }
-    
-    # Icon mapping
-    icon_map = {
-        'camera': 'camera',
-        'video': 'video-camera',
-        'photo': 'picture-o',
-        'film': 'film',
-        'play': 'play-circle',
-        'location': 'map-marker',
-        'home': 'home',
-        'car': 'car',
-        'flag': 'flag',
-        'info': 'info-circle',
-        'star': 'star',
-        'circle': 'circle'
-    }
-    
     stats = {
         'total': 0,
         'with_media': 0,
@@ -1147,49 +1640,90 @@ def create_html_map(
         'ankle_monitor': 0
     }
     
-    # Track marker data for later injection
-    marker_data = []
+    # Markers are created in the browser from these rows instead of as folium
+    # objects: [lat, lon, coord, datetime, title, popup, color, icon] as JSON, per cluster
+    marker_data = {marker_type: [] for marker_type, _ in _CLUSTERS}
+    marker_data['outlier'] = []
     
     media_base = Path(r"C:\Users\mactwo\Desktop\MapMediaWork\Media")
     
     print(f"\n📌 Adding markers...")
     
-    for idx, row in df.iterrows():
+    # Derive every marker property as a column; the loop below only builds
+    # popups and folium objects
+    lats = pd.to_numeric(df[lat_col], errors='coerce')
+    lons = pd.to_numeric(df[lon_col], errors='coerce')
+    media_paths = _str_column(df, media_col, '')
+    descriptions = _str_column(df, description_col, '')
+    if 'datetime' in df.columns:
+        datetimes = df['datetime'].astype(str).where(df['datetime'].notna(), '')
+    else:
+        datetimes = pd.Series('', index=df.index, dtype=object)
+    if 'accuracy_meters' in df.columns:
+        accuracies = pd.to_numeric(df['accuracy_meters'], errors='coerce').fillna(0).astype(float)
+    else:
+        accuracies = pd.Series(0.0, index=df.index)
+    exts = media_paths.str.lower().str.extract(r'(\.[^.\\/]+)$', expand=False).fillna('')
+    
+    prepared = pd.DataFrame({
+        'lat': lats,
+        'lon': lons,
+        'title': _str_column(df, title_col, 'Untitled'),
+        'description': descriptions,
+        'clean_description': descriptions.str.replace(_MODIFIED_RE, '', regex=True),
+        'media_path': media_paths,
+        'has_media_path': (media_paths != '') & (media_paths != 'nan'),
+        'ext': exts,
+        'is_image': exts.isin(['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.tif']),
+        'is_video': exts.isin(['.mp4', '.mov', '.avi', '.wmv', '.mkv', '.webm', '.m4v']),
+        'icon_type': _str_column(df, icon_col, 'camera'),
+        'color': _str_column(df, color_col, 'blue'),
+        'datetime': datetimes,
+        'data_source': _str_column(df, 'data_source', 'MediaMarkers'),
+        'accuracy_meters': accuracies,
+        'outlier': outliers,
+    }, index=df.index)
+    
+    # Rows whose coordinates are not numbers cannot become markers
+    bad_coords = prepared['lat'].isna() | prepared['lon'].isna()
+    for idx in prepared.index[bad_coords]:
+        print(f"⚠️  Warning: Could not add marker for row {idx}: non-numeric coordinates")
+    prepared = prepared[~bad_coords]
+    
+    # One directory listing per media folder instead of exists() + stat() per row
+    media_sizes = _media_sizes(prepared.loc[prepared['has_media_path'], 'media_path'])
+    
+    # Repeated GPS fixes draw identical accuracy circles; one per footprint is enough
+    circle_seen = set()
+    
+    # The popup metadata columns are the same for every row; format their
+    # values once, with missing, empty and 'nan' cells as None
+    shown_cols = {lat_col, lon_col, title_col, description_col, media_col, icon_col, color_col}
+    extra_cols = [col for col in df.columns if col not in shown_cols]
+    extras = df.loc[prepared.index, extra_cols]
+    extra_strs = extras.astype(str).astype(object)
+    extra_strs = extra_strs.where(extras.notna() & (extra_strs != '') & (extra_strs != 'nan'), None)
+    
+    for (idx, lat, lon, title, description, clean_description, media_path, has_media_path,
+         ext, is_image, is_video, icon_type, color, datetime_val, data_source,
+         accuracy_meters, outlier), extra_values in zip(prepared.itertuples(name=None),
+                                               extra_strs.itertuples(index=False, name=None)):
         try:
-            lat = float(row[lat_col])
-            lon = float(row[lon_col])
-            
-            # Get marker properties
-            title = str(row.get(title_col, 'Untitled')) if title_col in row.index else 'Untitled'
-            description = str(row.get(description_col, '')) if description_col in row.index else ''
-            media_path = str(row.get(media_col, '')) if media_col in row.index else ''
-            icon_type = str(row.get(icon_col, 'camera')) if icon_col in row.index else 'camera'
-            color = str(row.get(color_col, 'blue')) if color_col in row.index else 'blue'
-            datetime_val = str(row.get('datetime', '')) if 'datetime' in row.index and pd.notna(row.get('datetime')) else ''
-            data_source = str(row.get('data_source', 'MediaMarkers')) if 'data_source' in row.index else 'MediaMarkers'
-            accuracy_meters = float(row.get('accuracy_meters', 0)) if 'accuracy_meters' in row.index and pd.notna(row.get('accuracy_meters')) else 0
-            
-            # Build popup HTML
-            popup_html = f"<div style='font-family: Arial; max-width: 400px;'>"
-            popup_html += f"<h3 style='margin-top: 0; color: #333;'>{title}</h3>"
-            
             # Handle media
+            media_html = ''
             has_media = False
             is_video_marker = False
-            if media_path and media_path != 'nan' and media_col in row.index:
+            if has_media_path:
                 file_path = Path(media_path)
+                media_size = media_sizes.get(_media_key(media_path))
                 
-                if file_path.exists():
+                if media_size is not None:
                     has_media = True
                     stats['with_media'] += 1
                     
-                    ext = file_path.suffix.lower()
-                    is_image = ext in ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.tif']
-                    is_video = ext in ['.mp4', '.mov', '.avi', '.wmv', '.mkv', '.webm', '.m4v']
-                    
                     is_video_marker = is_video  # Track if this is a video marker
                     
-                    file_size_mb = file_path.stat().st_size / (1024 * 1024)
+                    file_size_mb = media_size / (1024 * 1024)
                     
                     if use_localhost:
                         # Create localhost URL
@@ -1203,50 +1737,21 @@ def create_html_map(
                             media_url = f"http://localhost:{localhost_port}/Media/{quote(str(file_path.name))}"
                         
                         if is_image:
-                            popup_html += f"""
-                            <img src="{media_url}" style="width: 100%; max-width: 400px; height: auto; border-radius: 5px; margin: 10px 0;"/>
-                            <p style="margin: 5px 0; color: #666; font-size: 0.9em;">📷 {file_path.name} ({file_size_mb:.1f} MB)</p>
-                            """
+                            media_html = _IMAGE_POPUP_BLOCK.format(
+                                url=media_url, name=file_path.name, size_mb=file_size_mb)
                             stats['images'] += 1
                         
                         elif is_video:
-                            # Map video extensions to proper MIME types
-                            mime_map = {
-                                '.mp4': 'video/mp4',
-                                '.m4v': 'video/mp4',
-                                '.webm': 'video/webm',
-                                '.ogv': 'video/ogg',
-                                '.avi': 'video/x-msvideo',
-                                '.mov': 'video/quicktime',
-                                '.wmv': 'video/x-ms-wmv',
-                                '.mkv': 'video/x-matroska'
-                            }
-                            mime_type = mime_map.get(ext.lower(), f'video/{ext[1:]}')
-                            
-                            popup_html += f"""
-                            <video controls preload="metadata" style="width: 100%; max-width: 550px; height: 300px; border-radius: 5px; margin: 10px 0; background: #000;" onerror="this.style.display='none'; this.nextElementSibling.style.display='block';">
-                                <source src="{media_url}" type="{mime_type}">
-                                Your browser does not support this video format.
-                            </video>
-                            <div style="display:none; padding: 15px; background: #fff3cd; border: 1px solid #ffc107; border-radius: 5px; margin: 10px 0;">
-                                <p style="margin: 0; color: #856404;">⚠️ Video preview not available. Click the button below to open the video in a new tab.</p>
-                            </div>
-                            <p style="margin: 5px 0; color: #666; font-size: 0.9em;">🎥 {file_path.name} ({file_size_mb:.1f} MB)</p>
-                            <p style="margin: 5px 0;">
-                                <a href="{media_url}" target="_blank" style="color: #0066cc; text-decoration: none; background: #007bff; color: white; padding: 8px 15px; border-radius: 3px; display: inline-block; font-weight: bold;">▶ Open Video in New Tab</a>
-                            </p>
-                            """
+                            mime_type = _VIDEO_MIME_TYPES.get(ext.lower(), f'video/{ext[1:]}')
+                            media_html = _VIDEO_POPUP_BLOCK.format(
+                                url=media_url, mime_type=mime_type, name=file_path.name,
+                                size_mb=file_size_mb)
                             stats['videos'] += 1
                     else:
                         # Show file path only
-                        popup_html += f"""
-                        <p style="background: #f0f0f0; padding: 10px; border-radius: 3px; font-family: monospace; word-break: break-all; font-size: 0.85em;">
-                        {file_path.absolute()}
-                        </p>
-                        <p style="margin: 5px 0; color: #666; font-size: 0.9em;">
-                        {'📷 Image' if is_image else '🎥 Video'}: {file_path.name} ({file_size_mb:.1f} MB)
-                        </p>
-                        """
+                        media_html = _MEDIA_PATH_POPUP_BLOCK.format(
+                            path=file_path.absolute(), kind='📷 Image' if is_image else '🎥 Video',
+                            name=file_path.name, size_mb=file_size_mb)
                         if is_image:
                             stats['images'] += 1
                         elif is_video:
@@ -1256,40 +1761,32 @@ def create_html_map(
                 stats['no_media'] += 1
             
             # Add description (remove Modified timestamp if present)
+            description_html = ''
             if description and description != 'nan':
-                # Remove the "Modified: YYYY-MM-DD HH:MM" portion from description
-                import re
-                clean_description = re.sub(r'\s*\|\s*Modified:\s*[\d\-:\s]+', '', description)
-                popup_html += f"<p style='margin: 10px 0;'>{clean_description}</p>"
+                # The "Modified: YYYY-MM-DD HH:MM" portion was stripped up front
+                description_html = f"<p style='margin: 10px 0;'>{clean_description}</p>"
             
             # Add other metadata
-            metadata_html = "<div style='margin-top: 10px; padding-top: 10px; border-top: 1px solid #ddd; font-size: 0.9em; color: #666;'>"
-            
-            for col in df.columns:
-                if col not in [lat_col, lon_col, title_col, description_col, media_col, icon_col, color_col]:
-                    if pd.notna(row[col]):
-                        value = str(row[col])
-                        if value and value != 'nan':
-                            metadata_html += f"<b>{col}:</b> {value}<br/>"
+            metadata_html = ''.join(f"<b>{col}:</b> {value}<br/>"
+                                    for col, value in zip(extra_cols, extra_values)
+                                    if value is not None)
             
-            metadata_html += "</div>"
-            popup_html += metadata_html
-            popup_html += "</div>"
+            popup_html = _POPUP_TEMPLATE.format(title=title, media=media_html,
+                                                description=description_html,
+                                                metadata=metadata_html)
             
             # Create marker
-            folium_color = color_map.get(color.lower(), 'blue')
-            folium_icon = icon_map.get(icon_type.lower(), 'camera')
+            folium_color = _MARKER_COLORS.get(color.lower(), 'blue')
+            folium_icon = _MARKER_ICONS.get(icon_type.lower(), 'camera')
             
             # Determine which cluster to add marker to based on data source
             if data_source == 'MasterMapData':
                 # Event markers from MasterMapData
                 if 'ATT Location' in title:
-                    target_cluster = att_cluster
                     marker_type = 'att_location'
                     stats['att_location'] += 1
                     folium_color = 'lightgreen'
                 else:  # Ankle Monitor Fix or other events
-                    target_cluster = ankle_cluster
                     marker_type = 'ankle_monitor'
                     stats['ankle_monitor'] += 1
                     folium_color = 'orange'
@@ -1297,42 +1794,24 @@ def create_html_map(
                 folium_icon = 'circle'
             else:
                 # Media markers
-                target_cluster = video_cluster if is_video_marker else image_cluster
                 marker_type = 'video' if is_video_marker else 'image'
             
-            marker = folium.Marker(
-                location=[lat, lon],
-                popup=folium.Popup(popup_html, max_width=600),
-                tooltip=title,
-                icon=folium.Icon(color=folium_color, icon=folium_icon, prefix='fa')
-            )
-            marker.add_to(target_cluster)
+            # Store marker data for the page script and for filtering
+            # Serialized right away, so only the JSON text is kept per marker;
+            # popups hold HTML, so keep "</" from closing the script
+            row = [lat, lon, _coord_key(lat, lon), datetime_val, title,
+                   popup_html, folium_color, folium_icon]
+            if outlier:
+                # Outliers share one list, so they carry their type for the filters
+                row.append(marker_type)
+            row_json = _dumps(row)
+            marker_data['outlier' if outlier else marker_type].append(row_json.replace('</', '<\\/'))
             
             # Add accuracy circle if accuracy data exists
-            if accuracy_meters > 0:
-                # Map folium colors to CSS/hex colors for circles
-                circle_color_map = {
-                    'lightgreen': '#90EE90',
-                    'orange': '#FFA500',
-                    'blue': '#0000FF',
-                    'red': '#FF0000',
-                    'green': '#008000',
-                    'purple': '#800080',
-                    'darkred': '#8B0000',
-                    'lightred': '#FFB6C1',
-                    'beige': '#F5F5DC',
-                    'darkblue': '#00008B',
-                    'darkgreen': '#006400',
-                    'cadetblue': '#5F9EA0',
-                    'darkpurple': '#9400D3',
-                    'white': '#FFFFFF',
-                    'pink': '#FFC0CB',
-                    'lightblue': '#ADD8E6',
-                    'gray': '#808080',
-                    'black': '#000000',
-                    'lightgray': '#D3D3D3'
-                }
-                circle_color = circle_color_map.get(folium_color, '#0000FF')
+            circle_key = (round(lat, 5), round(lon, 5), round(accuracy_meters), folium_color)
+            if accuracy_meters > 0 and circle_key not in circle_seen:
+                circle_seen.add(circle_key)
+                circle_color = _CIRCLE_COLORS.get(folium_color, '#0000FF')
                 
                 # Create the accuracy circle
                 circle = folium.Circle(
@@ -1348,15 +1827,6 @@ def create_html_map(
                 )
                 circle.add_to(accuracy_group)
             
-            # Store marker data for filtering
-            marker_data.append({
-                'lat': lat,
-                'lon': lon,
-                'type': marker_type,
-                'datetime': datetime_val,
-                'title': title
-            })
-            
             stats['total'] += 1
             
             if (idx + 1) % 100 == 0:
@@ -1369,129 +1839,18 @@ def create_html_map(
     # Add layer control
     folium.LayerControl().add_to(m)
     
-    # Save map
+    # Render the map once; the cluster references and the sidebar are
+    # added while the page is written, without a save/read round trip
     print(f"\n💾 Saving map to: {output_html}")
-    m.save(output_html)
+    map_html = m.get_root().render()
     
     # Inject cluster references into the HTML
     print(f"🔧 Injecting cluster references...")
-    with open(output_html, 'r', encoding='utf-8') as f:
-        map_html = f.read()
-    
-    # Find the variable names that Folium assigned to our clusters
-    # Pattern to find cluster variable definitions
-    import re
-    cluster_pattern = r'var\s+(marker_cluster_[a-f0-9]+)\s+=\s+L\.markerClusterGroup'
-    cluster_matches = re.findall(cluster_pattern, map_html)
-    
-    # Find the accuracy group feature group variable
-    feature_group_pattern = r'var\s+(feature_group_[a-f0-9]+)\s+=\s+L\.featureGroup'
-    feature_group_matches = re.findall(feature_group_pattern, map_html)
-    accuracy_group_var = feature_group_matches[0] if feature_group_matches else None
-    
-    if len(cluster_matches) >= 4:
-        # Assume first is images, second is videos, third is ATT, fourth is ankle monitor
-        image_cluster_var = cluster_matches[0]
-        video_cluster_var = cluster_matches[1]
-        att_cluster_var = cluster_matches[2]
-        ankle_cluster_var = cluster_matches[3]
-        
-        # Find the map variable name
-        map_var_pattern = r'var\s+(map_[a-f0-9]+)\s+=\s+L\.map'
-        map_var_matches = re.findall(map_var_pattern, map_html)
-        map_var = map_var_matches[0] if map_var_matches else 'map'
-        
-        # Find where all clusters are added to the map and inject after that
-        # Pattern: .addTo(map_xxxxx);
-        
-        # Find the last occurrence of the ankle cluster being added to the map
-        add_to_pattern = f'{ankle_cluster_var}.addTo'
-        last_addto_pos = map_html.rfind(add_to_pattern)
-        
-        if last_addto_pos != -1:
-            # Find the semicolon after this addTo
-            semicolon_pos = map_html.find(';', last_addto_pos)
-            if semicolon_pos != -1:
-                # Build marker data JSON
-                marker_data_json = json.dumps(marker_data)
-                
-                # Inject right after the semicolon
-                injection_script = f"""
-        
-        // Store cluster references globally for filtering
-        window.imageCluster = {image_cluster_var};
-        window.videoCluster = {video_cluster_var};
-        window.attCluster = {att_cluster_var};
-        window.ankleCluster = {ankle_cluster_var};
-        window.accuracyGroup = {accuracy_group_var if accuracy_group_var else 'null'};
-        window.map_object = {map_var};
-        
-        // Store all markers with metadata for time-based filtering
-        window.allMarkersData = {marker_data_json};
-        
-        // Build allMarkers array by extracting markers from clusters
-        window.allMarkers = [];
-        {image_cluster_var}.eachLayer(function(marker) {{
-            var latlng = marker.getLatLng();
-            var markerData = window.allMarkersData.find(m => m.lat === latlng.lat && m.lon === latlng.lng);
-            if (markerData) {{
-                window.allMarkers.push({{
-                    marker: marker,
-                    lat: latlng.lat,
-                    lon: latlng.lng,
-                    type: 'image',
-                    datetime: markerData.datetime
-                }});
-            }}
-        }});
-        {video_cluster_var}.eachLayer(function(marker) {{
-            var latlng = marker.getLatLng();
-            var markerData = window.allMarkersData.find(m => m.lat === latlng.lat && m.lon === latlng.lng);
-            if (markerData) {{
-                window.allMarkers.push({{
-                    marker: marker,
-                    lat: latlng.lat,
-                    lon: latlng.lng,
-                    type: 'video',
-                    datetime: markerData.datetime
-                }});
-            }}
-        }});
-        {att_cluster_var}.eachLayer(function(marker) {{
-            var latlng = marker.getLatLng();
-            var markerData = window.allMarkersData.find(m => m.lat === latlng.lat && m.lon === latlng.lng);
-            if (markerData) {{
-                window.allMarkers.push({{
-                    marker: marker,
-                    lat: latlng.lat,
-                    lon: latlng.lng,
-                    type: 'att_location',
-                    datetime: markerData.datetime
-                }});
-            }}
-        }});
-        {ankle_cluster_var}.eachLayer(function(marker) {{
-            var latlng = marker.getLatLng();
-            var markerData = window.allMarkersData.find(m => m.lat === latlng.lat && m.lon === latlng.lng);
-            if (markerData) {{
-                window.allMarkers.push({{
-                    marker: marker,
-                    lat: latlng.lat,
-                    lon: latlng.lng,
-                    type: 'ankle_monitor',
-                    datetime: markerData.datetime
-                }});
-            }}
-        }});
-"""
-                map_html = map_html[:semicolon_pos+1] + injection_script + map_html[semicolon_pos+1:]
-        
-        with open(output_html, 'w', encoding='utf-8') as f:
-            f.write(map_html)
+    pieces = _process_html(map_html, marker_data)
     
     # Add sidebar with file tree
     print(f"🌳 Adding sidebar with file tree...")
-    add_sidebar_to_html(output_html, df, date_col='date', time_col='time')
+    _write_html(output_html, pieces, df, date_col='date', time_col='time')
     
     # Get file size
     html_size_kb = Path(output_html).stat().st_size / 1024
@@ -1511,7 +1870,11 @@ def create_html_map(
     if use_localhost:
         print(f"\n🌐 LOCALHOST SERVER REQUIRED:")
         print(f"   Media uses http://localhost:{localhost_port}")
-        print(f"   Run: python media_server.py")
+        # Only point at media_server.py when nothing is serving the port yet;
+        # the quick start may already be serving it from this process
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            if sock.connect_ex(('localhost', localhost_port)) != 0:
+                print(f"   Run: python media_server.py")
         print(f"   Keep server running while viewing the map")
     
     print(f"\n📍 TO VIEW:")
@@ -1527,6 +1890,128 @@ def create_html_map(
     return output_html
 
 
+class _ProcessWatcher:
+    """
+    Tells, without blocking or polling in a loop, whether a process is
+    still running; close() releases what it waits on.
+    
+    Linux waits on a pidfd and macOS on a kqueue exit note; elsewhere
+    Popen.poll() is already a zero-timeout wait. fd is the pidfd or kqueue
+    descriptor, readable once the process has exited, or None.
+    """
+    
+    def __init__(self, process):
+        self.process = process
+        self.fd = None
+        self._kq = None
+        self._exited = False
+        if hasattr(os, 'pidfd_open'):
+            try:
+                self.fd = os.pidfd_open(process.pid)
+            except OSError:
+                pass
+        elif hasattr(select, 'kqueue'):
+            kq = select.kqueue()
+            try:
+                kq.control([select.kevent(process.pid, select.KQ_FILTER_PROC,
+                                          select.KQ_EV_ADD, select.KQ_NOTE_EXIT)], 0)
+            except OSError:
+                kq.close()
+            else:
+                self._kq = kq
+                self.fd = kq.fileno()
+    
+    def running(self):
+        # The kqueue exit note is delivered once, so the answer is remembered
+        if not self._exited:
+            if self._kq is not None:
+                self._exited = bool(self._kq.control(None, 1, 0))
+            elif self.fd is not None:
+                # A pidfd stays readable once the process has exited
+                self._exited = bool(select.select([self.fd], [], [], 0)[0])
+            else:
+                self._exited = self.process.poll() is not None
+        return not self._exited
+    
+    def close(self):
+        # running() falls back to Popen.poll() afterwards
+        if self._kq is not None:
+            self._kq.close()
+        elif self.fd is not None:
+            os.close(self.fd)
+        self._kq = None
+        self.fd = None
+
+
+def _wait_for_server(watcher, port, timeout=5.0):
+    """
+    Wait until the watched process is listening on port; False if it exits
+    first or timeout passes.
+    
+    One selector waits on both watcher.fd (the pidfd on Linux, the kqueue on
+    macOS) and a non-blocking connect, so whichever happens first wakes it.
+    Without a watcher fd this is media_server.wait_for_port().
+    """
+    import media_server
+    if watcher.fd is None:
+        return media_server.wait_for_port(port, timeout)
+    
+    deadline = time.monotonic() + timeout
+    delay = 0.005
+    with selectors.DefaultSelector() as selector:
+        selector.register(watcher.fd, selectors.EVENT_READ)
+        while True:
+            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+                sock.setblocking(False)
+                err = sock.connect_ex(('localhost', port))
+                if err == 0:
+                    return True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                # A pending connect wakes the selector when it completes;
+                # a refused one is retried after the backoff
+                pending = err in (errno.EINPROGRESS, errno.EWOULDBLOCK)
+                if pending:
+                    selector.register(sock, selectors.EVENT_WRITE)
+                events = selector.select(remaining if pending else min(delay, remaining))
+                if pending:
+                    selector.unregister(sock)
+                for key, _ in events:
+                    if key.fileobj == watcher.fd:
+                        return False
+                    if sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) == 0:
+                        return True
+            delay = min(delay * 2, 0.1)
+
+
+async def _build_while_serving(build, finish):
+    """
+    Run the media server on this process's event loop while build() runs in
+    a worker thread, then call finish() and keep serving until Ctrl+C.
+    """
+    import media_server
+    try:
+        runner = await media_server.start_server()
+    except OSError as e:
+        # Something took the port after the quick start probed it
+        if media_server.wait_for_port(8001, timeout=0):
+            print("✅ Server already running on port 8001")
+        else:
+            print(f"❌ Could not start the server on port 8001: {e}")
+        await asyncio.to_thread(build)
+        finish()
+        return
+    print("✅ Server started on port 8001 (in this process)")
+    try:
+        await asyncio.to_thread(build)
+        finish()
+        print("\n🌐 Serving media from this window; press Ctrl+C to stop")
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
 if __name__ == "__main__":
     import sys
     
@@ -1546,6 +2031,8 @@ if __name__ == "__main__":
         output_file = "media_map_new.html"
         use_localhost = True
     
+    server_watcher = None
+    in_process = False
     if use_localhost:
         print("\nStarting server on port 8001...")
         # Check if server is already running
@@ -1555,32 +2042,59 @@ if __name__ == "__main__":
         sock.close()
         
         if result != 0:
-            # Server not running, start it
-            import subprocess
-            server_process = subprocess.Popen(
-                [sys.executable, 'media_server.py'],
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL,
-                creationflags=subprocess.CREATE_NEW_CONSOLE if sys.platform == 'win32' else 0
-            )
-            print(f"✅ Server started on port 8001 (PID: {server_process.pid})")
-            import time
-            time.sleep(1)  # Give server time to start
+            import media_server
+            if media_server.web is not None:
+                # Serve from this process rather than starting a second interpreter
+                in_process = True
+            else:
+                # Server not running, start it
+                import subprocess
+                server_process = subprocess.Popen(
+                    [sys.executable, 'media_server.py'],
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL,
+                    creationflags=subprocess.CREATE_NEW_CONSOLE if sys.platform == 'win32' else 0
+                )
+                server_watcher = _ProcessWatcher(server_process)
+                
+                # Continue as soon as the server is listening
+                if _wait_for_server(server_watcher, 8001):
+                    print(f"✅ Server started on port 8001 (PID: {server_process.pid})")
+                elif not server_watcher.running():
+                    print(f"❌ Server exited with code {server_process.poll()}")
+                else:
+                    print(f"⚠️  Server (PID: {server_process.pid}) is not listening on port 8001 yet")
         else:
             print("✅ Server already running on port 8001")
     
-    # Create map
-    create_html_map(
-        input_file=input_file,
-        output_html=output_file,
-        use_localhost=use_localhost,
-        auto_open=True
-    )
+    def build_map():
+        create_html_map(
+            input_file=input_file,
+            output_html=output_file,
+            use_localhost=use_localhost,
+            auto_open=True
+        )
     
-    if use_localhost:
-        print(f"\n🌐 Open in browser: http://localhost:8001/{output_file}")
+    def finish():
+        if server_watcher is not None and not server_watcher.running():
+            print("\n⚠️  The media server has stopped; run: python media_server.py")
+        elif use_localhost:
+            print(f"\n🌐 Open in browser: http://localhost:8001/{output_file}")
+        
+        if server_watcher is not None:
+            server_watcher.close()
+        
+        print("\n" + "="*70)
+        print("✅ DONE!")
+        print("="*70)
     
-    print("\n" + "="*70)
-    print("✅ DONE!")
-    print("="*70)
+    # Create map
+    if in_process:
+        try:
+            media_server.run_async(_build_while_serving(build_map, finish))
+        except KeyboardInterrupt:
+            print("\nShutting down server...")
+    else:
+        build_map()
+        finish()
 
@@ -4,14 +4,15 @@ Standalone Map Viewer Server
 Serves the pre-generated map HTML and media files
 """
 
-import http.server
-import socketserver
 import os
 import sys
+import threading
 import webbrowser
-import time
 from pathlib import Path
 
+import media_server
+from _media_handler import MediaHandler, MediaHTTPServer, make_handler
+
 # Handle PyInstaller bundled resources
 def resource_path(relative_path):
     """Get absolute path to resource, works for dev and for PyInstaller"""
@@ -23,18 +24,7 @@ def resource_path(relative_path):
 
 PORT = 8001
 
-class MapServerHandler(http.server.SimpleHTTPRequestHandler):
-    def __init__(self, *args, **kwargs):
-        # Serve from current directory (where executable is run from)
-        super().__init__(*args, directory=os.getcwd(), **kwargs)
-    
-    def end_headers(self):
-        # Add CORS headers
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET')
-        self.send_header('Cache-Control', 'no-store, no-cache, must-revalidate')
-        super().end_headers()
-    
+class MapServerHandler(MediaHandler):
     def log_message(self, format, *args):
         # Suppress log messages for cleaner output
         pass
@@ -60,6 +50,12 @@ def main():
             if Path(bundled_map).exists():
                 import shutil
                 shutil.copy(bundled_map, map_file)
+                # The build only bundles a .gz that is current with the page;
+                # give it the page's mtime so the servers see them as a pair
+                if Path(bundled_map + ".gz").exists():
+                    shutil.copy(bundled_map + ".gz", map_file + ".gz")
+                    page_stat = os.stat(map_file)
+                    os.utime(map_file + ".gz", ns=(page_stat.st_atime_ns, page_stat.st_mtime_ns))
                 print(f"✅ Extracted map file: {map_file}")
             else:
                 print(f"\n❌ ERROR: Map file not found!")
@@ -77,34 +73,47 @@ def main():
     # Start the server
     print(f"\n🌐 Starting server on port {PORT}...")
     
-    try:
-        with socketserver.TCPServer(("", PORT), MapServerHandler) as httpd:
-            print(f"✅ Server running at http://localhost:{PORT}")
-            print(f"\n🗺️  Opening map in browser...")
-            
-            # Give server a moment to start
-            time.sleep(0.5)
-            
-            # Open browser
+    def open_browser():
+        # Open browser as soon as the server answers
+        if media_server.wait_for_port(PORT):
             webbrowser.open(f"http://localhost:{PORT}/{map_file}")
-            
-            print(f"\n{'='*70}")
-            print("SERVER RUNNING - Keep this window open")
-            print("="*70)
-            print("\nThe map is now open in your browser.")
-            print("You can interact with the map, view media, and use all filters.")
-            print("\nPress Ctrl+C to stop the server and exit.")
-            print("="*70)
-            
-            # Keep server running
-            httpd.serve_forever()
+    
+    def server_ready():
+        print(f"✅ Server running at http://localhost:{PORT}")
+        print(f"\n🗺️  Opening map in browser...")
+        
+        # Off the serving thread, so serve_forever() starts right away
+        threading.Thread(target=open_browser, daemon=True).start()
+        
+        print(f"\n{'='*70}")
+        print("SERVER RUNNING - Keep this window open")
+        print("="*70)
+        print("\nThe map is now open in your browser.")
+        print("You can interact with the map, view media, and use all filters.")
+        print("\nPress Ctrl+C to stop the server and exit.")
+        print("="*70)
+    
+    try:
+        if media_server.web is not None:
+            # Single-threaded aiohttp static server, when aiohttp is installed
+            media_server.run_async(media_server.serve_async(os.getcwd(), PORT, on_ready=server_ready))
+        else:
+            # Serve from current directory (where executable is run from)
+            handler = make_handler(os.getcwd(), MapServerHandler)
+            # One thread per connection, so media requests do not queue behind each other
+            with MediaHTTPServer(("", PORT), handler) as httpd:
+                httpd.daemon_threads = True  # Ctrl+C does not wait on open connections
+                server_ready()
+                
+                # Keep server running
+                httpd.serve_forever()
             
     except KeyboardInterrupt:
         print("\n\n" + "="*70)
         print("Server stopped. Goodbye!")
         print("="*70)
     except OSError as e:
-        if "Address already in use" in str(e):
+        if "address already in use" in str(e).lower():
             print(f"\n❌ ERROR: Port {PORT} is already in use!")
             print("   Please close any other programs using this port and try again.")
         else:
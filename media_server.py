@@ -1,40 +1,222 @@
 """
 Simple HTTP Server for Media Files
 Run this alongside your Streamlit app to serve media files
+
+Pass --native to serve the folder with Caddy or nginx instead, when either
+is installed; the Python servers below are the fallback.
 """
 
-import http.server
-import socketserver
+import asyncio
+import mimetypes
 import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
 from pathlib import Path
 
+from _media_handler import MediaHTTPServer, gzip_is_stale, make_handler
+
+# aiohttp is optional; without it the threaded http.server fallback is used
+try:
+    from aiohttp import web
+except ImportError:
+    web = None
+
+# uvloop is optional and not available on Windows, where asyncio's own loop is used
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
 # Configuration
-WORKSPACE_FOLDER = r"C:\Users\mactwo\Desktop\MapMediaWork"
+# Folder to serve: MMM_WORKSPACE if set, else the directory the server starts in
+WORKSPACE_FOLDER = os.environ.get('MMM_WORKSPACE', os.getcwd())
+_RESOLVED = os.fspath(Path(WORKSPACE_FOLDER).resolve())  # once, not per request
 PORT = 8001
 
-class MediaHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, directory=WORKSPACE_FOLDER, **kwargs)
+MediaHTTPRequestHandler = make_handler(_RESOLVED)
+
+if web is not None:
+    # Folder the static route serves, for _media_headers
+    _DIRECTORY = web.AppKey('directory', str)
     
-    def end_headers(self):
-        # Add CORS headers to allow Streamlit to access the media
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET')
-        self.send_header('Cache-Control', 'no-store, no-cache, must-revalidate')
-        super().end_headers()
+    class _UncompressedFileResponse(web.FileResponse):
+        """FileResponse that always sends the file itself, never a .gz beside it"""
+        def _get_file_path_stat_encoding(self, accept_encoding):
+            return super()._get_file_path_stat_encoding('')
+    
+    @web.middleware
+    async def _media_headers(request, handler):
+        """Same CORS and no-cache headers as MediaHTTPRequestHandler.end_headers"""
+        # The static route sends <page>.gz whenever it exists; once the page
+        # is newer than it, send the page itself
+        filename = request.match_info.get('filename', '')
+        path = Path(request.app[_DIRECTORY], filename).resolve()
+        if (filename.endswith('.html') and path.is_relative_to(request.app[_DIRECTORY])
+                and gzip_is_stale(os.fspath(path))):
+            # Still a FileResponse, so ETag, Last-Modified and 304s work as on the static route
+            response = _UncompressedFileResponse(path)
+        else:
+            response = await handler(request)
+        response.headers['Access-Control-Allow-Origin'] = '*'
+        response.headers['Access-Control-Allow-Methods'] = 'GET'
+        response.headers['Cache-Control'] = 'no-cache'
+        if filename.endswith('.html'):
+            response.headers['Vary'] = 'Accept-Encoding'
+        return response
+
+async def start_server(directory=_RESOLVED, port=PORT):
+    """Start serving directory with aiohttp on the running loop; returns the AppRunner, whose cleanup() stops it"""
+    if web is None:
+        raise RuntimeError("aiohttp is not installed; run: pip install aiohttp")
+    app = web.Application(middlewares=[_media_headers])
+    app[_DIRECTORY] = directory
+    app.add_routes([web.static('/', directory, show_index=False)])
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, port=port).start()
+    except BaseException:
+        await runner.cleanup()
+        raise
+    return runner
+
+async def serve_async(directory=_RESOLVED, port=PORT, on_ready=None):
+    """Serve directory with aiohttp until cancelled; on_ready() runs once the port is bound"""
+    runner = await start_server(directory, port)
+    try:
+        if on_ready is not None:
+            on_ready()
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+def wait_for_port(port, timeout=5.0, host='localhost'):
+    """Probe until port accepts connections, backing off 5 ms to 100 ms; False on timeout"""
+    deadline = time.monotonic() + timeout
+    delay = 0.005
+    while True:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            if sock.connect_ex((host, port)) == 0:
+                return True
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, 0.1)
+
+CADDY_CONFIG = """{{
+    admin off
+}}
+:{port} {{
+    root * "{root}"
+    file_server
+    header Access-Control-Allow-Origin *
+    header Access-Control-Allow-Methods GET
+    header Cache-Control "no-cache"
+}}
+"""
+
+NGINX_CONFIG = """daemon off;
+pid nginx.pid;
+error_log stderr;
+events {{}}
+http {{
+    types {{
+{types}
+    }}
+    access_log off;
+    sendfile on;
+    tcp_nopush on;
+    client_body_temp_path tmp;
+    proxy_temp_path tmp;
+    fastcgi_temp_path tmp;
+    uwsgi_temp_path tmp;
+    scgi_temp_path tmp;
+    server {{
+        listen {port};
+        root "{root}";
+        add_header Access-Control-Allow-Origin * always;
+        add_header Access-Control-Allow-Methods GET always;
+        add_header Cache-Control "no-cache" always;
+    }}
+}}
+"""
+
+def serve_native(directory=_RESOLVED, port=PORT):
+    """Serve directory with Caddy or nginx until it exits; False if neither is installed"""
+    caddy = shutil.which('caddy')
+    nginx = shutil.which('nginx')
+    if not caddy and not nginx:
+        return False
+    
+    root = Path(directory).resolve().as_posix()
+    with tempfile.TemporaryDirectory(prefix='media_server_') as tmp:
+        if caddy:
+            config = Path(tmp) / 'Caddyfile'
+            config.write_text(CADDY_CONFIG.format(port=port, root=root), encoding='utf-8')
+            cmd = [caddy, 'run', '--config', str(config), '--adapter', 'caddyfile']
+        else:
+            # nginx's mime.types may not exist on this machine; use Python's table
+            by_type = {}
+            for ext, ctype in mimetypes.types_map.items():
+                by_type.setdefault(ctype, []).append(ext.lstrip('.'))
+            types = '\n'.join(f"        {ctype} {' '.join(exts)};" for ctype, exts in sorted(by_type.items()))
+            Path(tmp, 'tmp').mkdir()
+            config = Path(tmp) / 'nginx.conf'
+            config.write_text(NGINX_CONFIG.format(port=port, root=root, types=types), encoding='utf-8')
+            cmd = [nginx, '-p', tmp, '-c', str(config)]
+        
+        print(f"Serving with {Path(cmd[0]).name}")
+        process = subprocess.Popen(cmd)
+        try:
+            process.wait()
+        except KeyboardInterrupt:
+            process.terminate()
+            process.wait()
+            raise
+    return True
+
+def run_async(coro):
+    """asyncio.run(), on uvloop's faster event loop where it is installed"""
+    if uvloop is not None:
+        return uvloop.run(coro)
+    return asyncio.run(coro)
 
 if __name__ == "__main__":
     print(f"Starting Media Server...")
-    print(f"Serving files from: {WORKSPACE_FOLDER}")
+    print(f"Serving files from: {_RESOLVED}")
     print(f"Server running at: http://localhost:{PORT}")
     print(f"\n📍 IMPORTANT:")
     print(f"   Open your map at: http://localhost:{PORT}/media_map_new.html")
     print(f"   (NOT as a file:// URL)")
     print(f"\nPress Ctrl+C to stop the server\n")
     
-    with socketserver.TCPServer(("", PORT), MediaHTTPRequestHandler) as httpd:
+    served = False
+    if '--native' in sys.argv:
         try:
-            httpd.serve_forever()
+            served = serve_native()
         except KeyboardInterrupt:
             print("\nShutting down server...")
-            httpd.shutdown()
+            served = True
+        if not served:
+            print("Neither caddy nor nginx found on PATH; using the Python server")
+    
+    if not served:
+        if web is not None:
+            try:
+                run_async(serve_async())
+            except KeyboardInterrupt:
+                print("\nShutting down server...")
+        else:
+            # One thread per connection, so media requests do not queue behind each other
+            with MediaHTTPServer(("", PORT), MediaHTTPRequestHandler) as httpd:
+                httpd.daemon_threads = True  # Ctrl+C does not wait on open connections
+                try:
+                    httpd.serve_forever()
+                except KeyboardInterrupt:
+                    print("\nShutting down server...")
+                    httpd.shutdown()